@@ -5,6 +5,7 @@ from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 import os
+import tempfile
 
 app = Flask(__name__)
 
@@ -12,6 +13,52 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-me')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///classplaner.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['BABEL_DEFAULT_LOCALE'] = 'en'
+# Background schedule generation: solves allowed at once on this host, where
+# the per-slot lock files live, and how long a silent job is presumed dead
+app.config['SOLVER_MAX_CONCURRENT'] = int(os.environ.get('SOLVER_MAX_CONCURRENT', 2))
+app.config['SOLVER_LOCK_DIR'] = os.environ.get('SOLVER_LOCK_DIR', tempfile.gettempdir())
+app.config['JOB_STALE_SECONDS'] = int(os.environ.get('JOB_STALE_SECONDS', 60))
+# Named profile from app/solver_profiles.py used for every solve
+app.config['SOLVER_PROFILE'] = os.environ.get('SOLVER_PROFILE', 'default')
+# After a proved infeasibility, run a second single-worker solve to name the
+# clashing requirements
+app.config['SOLVER_EXPLAIN_INFEASIBLE'] = os.environ.get('SOLVER_EXPLAIN_INFEASIBLE', '1') == '1'
+# Timetables with at least this many lessons to place get a first solution
+# from CP-SAT and are then improved by large neighbourhood search; 0 disables
+app.config['SOLVER_LNS_LESSONS'] = int(os.environ.get('SOLVER_LNS_LESSONS', 2000))
+# Seconds the "Re-solve Changes" neighbourhood search may take at most;
+# without a timetable by then every unlocked lesson is re-solved
+app.config['SOLVER_INCREMENTAL_TIME_LIMIT'] = float(os.environ.get('SOLVER_INCREMENTAL_TIME_LIMIT', 0.5))
+# Results kept per solver process for inputs seen before (0 disables the
+# cache), and an optional SQLite file that shares them across processes
+app.config['SOLVER_CACHE_SIZE'] = int(os.environ.get('SOLVER_CACHE_SIZE', 64))
+app.config['SOLVER_CACHE_PATH'] = os.environ.get('SOLVER_CACHE_PATH', '')
+# Bearer token the /metrics endpoint asks for; empty switches it off
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+# Dropdown lists of periods, rooms, class groups, subjects and teachers kept
+# per user (app/reference_cache.py): users held per process (0 disables),
+# seconds an entry lives, and the SQLite file through which a change saved by
+# one worker invalidates every worker's copy on the host at once. An empty
+# path invalidates only the process that saved, i.e. suits one worker only.
+app.config['REFERENCE_CACHE_SIZE'] = int(os.environ.get('REFERENCE_CACHE_SIZE', 1024))
+app.config['REFERENCE_CACHE_TTL'] = float(os.environ.get('REFERENCE_CACHE_TTL', 300))
+app.config['REFERENCE_CACHE_PATH'] = os.environ.get(
+    'REFERENCE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'classplaner-reference.sqlite')
+)
+# Users whose rendered dashboard grid each process keeps (0 disables)
+app.config['DASHBOARD_CACHE_SIZE'] = int(os.environ.get('DASHBOARD_CACHE_SIZE', 256))
+# Request profiling (app/profiling.py): every request with PROFILE_REQUESTS,
+# otherwise requests sending "X-Profile: 1" from one of the comma-separated
+# PROFILER_ADMINS usernames, who also see the /profiling report. A share of
+# profiled requests (always those asked for by header) get a cProfile dump.
+app.config['PROFILE_REQUESTS'] = os.environ.get('PROFILE_REQUESTS', '0') == '1'
+app.config['PROFILER_ADMINS'] = {
+    name.strip() for name in os.environ.get('PROFILER_ADMINS', '').split(',') if name.strip()
+}
+app.config['PROFILER_SAMPLE_RATE'] = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+app.config['PROFILER_DUMP_DIR'] = os.environ.get(
+    'PROFILER_DUMP_DIR', os.path.join(tempfile.gettempdir(), 'classplaner-profiles')
+)
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
@@ -20,4 +67,4 @@ login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 csrf = CSRFProtect(app)
 
-from app import routes, models
+from app import routes, models, profiling
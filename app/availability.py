@@ -0,0 +1,119 @@
+DAYS = list(range(1, 6))
+
+
+class WeekGrid:
+    # Availability over the week as an integer bitset: bit
+    # day_index * len(period_ids) + period_index is the slot (day, period).
+    # Intersecting teacher, group and room availability is then a handful of
+    # integer ANDs instead of list membership tests.
+
+    def __init__(self, days, period_ids):
+        self.days = list(days)
+        self.period_ids = list(period_ids)
+        self.width = len(self.period_ids)
+        self.day_index = {d: i for i, d in enumerate(self.days)}
+        self.period_index = {p: i for i, p in enumerate(self.period_ids)}
+        self.full = (1 << len(self.days) * self.width) - 1
+        self.day_rows = {d: ((1 << self.width) - 1) << i * self.width for d, i in self.day_index.items()}
+        column = sum(1 << i * self.width for i in range(len(self.days)))
+        self.period_columns = {p: column << i for p, i in self.period_index.items()}
+        self._masks = {}  # (days, periods) -> mask
+        self._rows = {}   # one day's bits -> period ids set in them
+
+    def bit(self, day, period):
+        # 0 for a day or period outside the grid
+        if day not in self.day_index or period not in self.period_index:
+            return 0
+        return 1 << self.day_index[day] * self.width + self.period_index[period]
+
+    def mask(self, days=None, periods=None):
+        # Every slot on one of `days` in one of `periods`; None means all.
+        # Teachers and groups repeat the same few combinations, so results
+        # are memoised.
+        key = (None if days is None else tuple(days), None if periods is None else tuple(periods))
+        mask = self._masks.get(key)
+        if mask is None:
+            rows = self.full if days is None else 0
+            for d in days or ():
+                rows |= self.day_rows.get(d, 0)
+            columns = self.full if periods is None else 0
+            for p in periods or ():
+                columns |= self.period_columns.get(p, 0)
+            mask = self._masks[key] = rows & columns
+        return mask
+
+    def day_count(self, mask):
+        # Days with at least one slot in `mask`
+        return sum(1 for row in self.day_rows.values() if mask & row)
+
+    def slots(self, mask):
+        # (day, period) pairs set in `mask`, day by day in period order. Each
+        # day's bits are decoded once per distinct pattern.
+        found = []
+        row_mask = (1 << self.width) - 1
+        for d in self.days:
+            row = mask & row_mask
+            mask >>= self.width
+            if not row:
+                continue
+            periods = self._rows.get(row)
+            if periods is None:
+                periods = self._rows[row] = [
+                    p for i, p in enumerate(self.period_ids) if row >> i & 1
+                ]
+            found.extend((d, p) for p in periods)
+        return found
+
+
+def occupancy(grid, entries):
+    # Busy slots per group, teacher and room for entry dicts shaped like
+    # schedule_generator.load_entries. Two lessons in one slot may share
+    # none of these: the generator, the move check and the free-slot
+    # highlighting all take that rule from here.
+    busy = {'group': {}, 'teacher': {}, 'room': {}}
+    for e in entries:
+        occupy(grid, busy, e)
+    return busy
+
+
+def occupy(grid, busy, e):
+    # Marks entry dict `e`'s slot busy for its group, teacher and room
+    bit = grid.bit(e['weekday'], e['period'])
+    for kind in busy:
+        if e[kind] is not None:
+            busy[kind][e[kind]] = busy[kind].get(e[kind], 0) | bit
+
+
+def clashes(grid, busy, e):
+    # Kinds of `busy` for which entry dict `e`'s slot is already taken
+    bit = grid.bit(e['weekday'], e['period'])
+    return [kind for kind in busy if e[kind] is not None and busy[kind].get(e[kind], 0) & bit]
+
+
+def week_grid(data):
+    # One WeekGrid per solver input; the copies made by restrict() share it
+    if 'grid' not in data:
+        data['grid'] = WeekGrid(data['days'], data['period_ids'])
+    return data['grid']
+
+
+def assignment_mask(a, data):
+    # Allowed slots for one assignment as a WeekGrid bitset: teacher
+    # preferences intersected with the group's allowed periods, minus slots
+    # and days already taken by fixed entries
+    grid = week_grid(data)
+    mask = grid.mask(None, a['group_allowed'])
+    teacher = data['teachers'].get(a['teacher'])
+    if teacher:
+        mask &= grid.mask(teacher['days'], teacher['periods'])
+    if a.get('blocked_days'):
+        mask &= ~grid.mask(a['blocked_days'])
+
+    blocked = data.get('blocked')
+    if blocked:
+        mask &= ~(
+            blocked['group'].get(a['group'], 0)
+            | blocked['teacher'].get(a['teacher'], 0)
+            | blocked['room'].get(a['room'], 0)
+        )
+    return mask
@@ -0,0 +1,53 @@
+import threading
+
+
+def components(data):
+    # Split a solver input into independent parts: assignments are connected
+    # when they share a class group, a teacher or a room, and each connected
+    # component becomes its own input dict (same days, periods, teachers and
+    # blocked slots, its own assignments). Largest part first, so a pool
+    # starts the slowest solve earliest.
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a in data['assignments']:
+        root = find(('assignment', a['id']))
+        for kind in ('group', 'teacher', 'room'):
+            if a[kind] is not None:
+                parent[find((kind, a[kind]))] = root
+
+    parts = {}
+    for a in data['assignments']:
+        parts.setdefault(find(('assignment', a['id'])), []).append(a)
+    return [
+        dict(data, assignments=assignments)
+        for assignments in sorted(parts.values(), key=len, reverse=True)
+    ]
+
+
+class CombinedProgress:
+    # One progress stream for components solved side by side: every report
+    # sums solutions, objective and bound over the components that have a
+    # solution so far, and wall time is the slowest component's.
+    def __init__(self, on_progress):
+        self.on_progress = on_progress
+        self.latest = {}
+        self.lock = threading.Lock()
+
+    def for_part(self, index):
+        def report(info):
+            with self.lock:
+                self.latest[index] = info
+                reports = list(self.latest.values())
+            self.on_progress({
+                'solutions': sum(r['solutions'] for r in reports),
+                'objective': sum(r['objective'] for r in reports),
+                'bound': sum(r['bound'] for r in reports),
+                'wall_time': max(r['wall_time'] for r in reports),
+            })
+        return report
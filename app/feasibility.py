@@ -0,0 +1,97 @@
+from app.availability import assignment_mask, week_grid
+from app.models import ClassGroup, Room, Subject, Teacher
+
+
+class Infeasible(Exception):
+    # Raised by the generator when a schedule provably cannot exist;
+    # `problems` are dicts as produced by counting_bounds()
+    def __init__(self, problems):
+        super().__init__(f"{len(problems)} infeasible requirement(s)")
+        self.problems = problems
+
+
+def counting_bounds(data):
+    # Necessary conditions checked before any model is built, in
+    # milliseconds: every assignment fits its own slots and days, and every
+    # teacher, group and room has at least as many usable slots (and
+    # teachers enough weekly hours) as the lessons that need them.
+    # Returns a list of problem dicts; empty does not prove feasibility.
+    grid = week_grid(data)
+    problems = []
+    demand = {'teacher': {}, 'group': {}, 'room': {}}
+    reach = {'teacher': {}, 'group': {}, 'room': {}}
+
+    for a in data['assignments']:
+        if a['hours'] <= 0:
+            continue
+        mask = assignment_mask(a, data)
+        available = min(mask.bit_count(), grid.day_count(mask))
+        if a['hours'] > available:
+            problems.append({
+                'kind': 'assignment_slots', 'group': a['group'], 'subject': a['subject'],
+                'teacher': a['teacher'], 'need': a['hours'], 'available': available,
+            })
+        for kind in demand:
+            key = a[kind]
+            if key is None or (kind == 'teacher' and key not in data['teachers']):
+                continue
+            demand[kind][key] = demand[kind].get(key, 0) + a['hours']
+            reach[kind][key] = reach[kind].get(key, 0) | mask
+
+    for t_id, need in demand['teacher'].items():
+        limit = data['teachers'][t_id]['week_hours']
+        if need > limit:
+            problems.append({'kind': 'teacher_hours', 'teacher': t_id, 'need': need, 'available': limit})
+    for kind, needs in demand.items():
+        for key, need in needs.items():
+            available = reach[kind][key].bit_count()
+            if need > available:
+                problems.append({'kind': f'{kind}_slots', kind: key, 'need': need, 'available': available})
+    return problems
+
+
+def explain(user_id, problems):
+    # One sentence per problem, with the user's names for every id
+    names = {
+        'group': {g.id: g.name for g in ClassGroup.query.filter_by(user_id=user_id)},
+        'subject': {s.id: s.name for s in Subject.query.filter_by(user_id=user_id)},
+        'teacher': {t.id: t.name for t in Teacher.query.filter_by(user_id=user_id)},
+        'room': {r.id: r.name for r in Room.query.filter_by(user_id=user_id)},
+    }
+
+    def name(kind, key):
+        return names[kind].get(key, f"#{key}")
+
+    def lesson(p):
+        text = f"{name('group', p['group'])} {name('subject', p['subject'])}"
+        return f"{text} ({name('teacher', p['teacher'])})" if p.get('teacher') else text
+
+    sentences = []
+    for p in problems:
+        kind = p['kind']
+        if kind == 'assignment_slots':
+            sentences.append(
+                f"{lesson(p)} needs {p['need']} lessons a week but fits only "
+                f"{p['available']} (one per day, within the teacher's and group's periods)."
+            )
+        elif kind == 'teacher_hours':
+            sentences.append(
+                f"{name('teacher', p['teacher'])} is assigned {p['need']} hours "
+                f"but may teach at most {p['available']}."
+            )
+        elif kind in ('teacher_slots', 'group_slots', 'room_slots'):
+            owner = kind.split('_')[0]
+            sentences.append(
+                f"{name(owner, p[owner])} has {p['need']} lessons to place "
+                f"but only {p['available']} usable slots."
+            )
+        elif kind == 'unplaced':
+            sentences.append(f"{lesson(p)}: {p['need']} lesson(s) could not be placed.")
+        elif kind == 'core':
+            parts = [
+                f"{name('teacher', part['teacher'])} at most {part['available']} hours"
+                if part['kind'] == 'teacher_hours' else f"{lesson(part)} {part['need']}h"
+                for part in p['parts']
+            ]
+            sentences.append("These requirements cannot all be met together: " + "; ".join(parts) + ".")
+    return sentences
@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, IntegerField, PasswordField, SubmitField, SelectMultipleField, widgets, TimeField, SelectField, TextAreaField, BooleanField
-from wtforms.validators import DataRequired, NumberRange, Length, EqualTo, Optional
+from wtforms.validators import DataRequired, InputRequired, NumberRange, Length, EqualTo, Optional
 
 class RegisterForm(FlaskForm):
 	username = StringField('Username', validators=[DataRequired(), Length(min=3, max=50)])
@@ -70,6 +70,7 @@ class ClassGroupForm(FlaskForm):
         widget=widgets.ListWidget(prefix_label=False),
         validators=[Optional()]
     )
+    is_junior = BooleanField('Junior group (prefer early lessons)')
     submit = SubmitField('Save Class Group')
 
 class ScheduleAssignmentForm(FlaskForm):
@@ -138,3 +139,23 @@ class TimetableEntryForm(FlaskForm):
     is_locked = BooleanField('Lock this entry')
     notes = TextAreaField('Notes', validators=[Optional()])
     submit = SubmitField('Save Entry')
+
+class SolverSettingsForm(FlaskForm):
+    # Penalty weights: 0 ignores the preference, higher values matter more
+    teacher_gaps = IntegerField(
+        'Teacher gaps', validators=[InputRequired(), NumberRange(min=0, max=100)]
+    )
+    unpreferred_periods = IntegerField(
+        'Lessons outside teacher preferences', validators=[InputRequired(), NumberRange(min=0, max=100)]
+    )
+    subject_spread = IntegerField(
+        'Same subject on consecutive days', validators=[InputRequired(), NumberRange(min=0, max=100)]
+    )
+    junior_late = IntegerField(
+        'Late lessons for junior groups', validators=[InputRequired(), NumberRange(min=0, max=100)]
+    )
+    junior_periods = IntegerField(
+        'Junior groups finish after period', validators=[DataRequired(), NumberRange(min=1)]
+    )
+    soft_preferences = BooleanField('Treat teacher preferences as wishes, not rules')
+    submit = SubmitField('Save Settings')
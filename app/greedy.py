@@ -0,0 +1,109 @@
+from app.availability import assignment_mask, week_grid
+
+
+def greedy(data, hints=()):
+    # Best-effort timetable for a solver input without CP-SAT, in
+    # milliseconds: hinted (aid, day, period) lessons that still fit are
+    # placed first, then the remaining assignments, most constrained first
+    # (fewest free slots per lesson still to place), each lesson on the
+    # usable slot whose day is lightest for the class group, earliest period
+    # first. A lesson with no free slot may take one whose only occupant can
+    # move to another free slot. Returns ({aid: {(day, period)}}, unplaced)
+    # where unplaced are 'unplaced' problem dicts (app/feasibility.py) for
+    # lessons that found no slot. Hard rules are kept, so a complete result
+    # is a valid timetable.
+    grid = week_grid(data)
+    assignments = {a['id']: a for a in data['assignments']}
+    domains = {aid: assignment_mask(a, data) for aid, a in assignments.items()}
+    busy = {'group': {}, 'teacher': {}, 'room': {}}
+    occupant = {}  # (kind, key, day, period) -> aid
+    load = {}  # teacher -> lessons placed
+    placed = {aid: set() for aid in assignments}
+    used_days = {aid: 0 for aid in assignments}  # day rows already holding the assignment
+
+    def owners(a):
+        # the (kind, key) pairs a lesson of `a` occupies, as in build_model
+        for kind in busy:
+            key = a[kind]
+            if key is not None and (kind != 'teacher' or key in data['teachers']):
+                yield kind, key
+
+    def usable(a):
+        if a['teacher'] in data['teachers'] and \
+                load.get(a['teacher'], 0) >= data['teachers'][a['teacher']]['week_hours']:
+            return 0
+        mask = domains[a['id']] & ~used_days[a['id']]
+        for kind, key in owners(a):
+            mask &= ~busy[kind].get(key, 0)
+        return mask
+
+    def place(a, d, p):
+        bit = grid.bit(d, p)
+        for kind, key in owners(a):
+            busy[kind][key] = busy[kind].get(key, 0) | bit
+            occupant[(kind, key, d, p)] = a['id']
+        if a['teacher'] in data['teachers']:
+            load[a['teacher']] = load.get(a['teacher'], 0) + 1
+        placed[a['id']].add((d, p))
+        used_days[a['id']] |= grid.day_rows[d]
+
+    def remove(a, d, p):
+        bit = grid.bit(d, p)
+        for kind, key in owners(a):
+            busy[kind][key] &= ~bit
+            del occupant[(kind, key, d, p)]
+        if a['teacher'] in data['teachers']:
+            load[a['teacher']] -= 1
+        placed[a['id']].discard((d, p))
+        used_days[a['id']] &= ~grid.day_rows[d]
+
+    def eject(a):
+        # Free a slot for one more lesson of `a` by moving the one lesson
+        # blocking it; False if no slot of its domain works that way
+        if a['teacher'] in data['teachers'] and \
+                load.get(a['teacher'], 0) >= data['teachers'][a['teacher']]['week_hours']:
+            return False
+        for d, p in grid.slots(domains[a['id']] & ~used_days[a['id']]):
+            blockers = {occupant.get((kind, key, d, p)) for kind, key in owners(a)} - {None}
+            if len(blockers) != 1:
+                continue
+            b = assignments[blockers.pop()]
+            remove(b, d, p)
+            moves = grid.slots(usable(b) & ~grid.bit(d, p))
+            if moves and usable(a) & grid.bit(d, p):
+                place(b, *moves[0])
+                place(a, d, p)
+                return True
+            place(b, d, p)
+        return False
+
+    for aid, d, p in sorted(hints):
+        a = assignments.get(aid)
+        if a and len(placed[aid]) < a['hours'] and grid.bit(d, p) & usable(a):
+            place(a, d, p)
+
+    def slack(a):
+        mask = usable(a)
+        return min(mask.bit_count(), grid.day_count(mask)) - (a['hours'] - len(placed[a['id']]))
+
+    pending = [a for a in assignments.values() if len(placed[a['id']]) < a['hours']]
+    pending.sort(key=lambda a: (slack(a), -a['hours'], a['id']))
+    for a in pending:
+        while len(placed[a['id']]) < a['hours']:
+            slots = grid.slots(usable(a))
+            if not slots:
+                if not eject(a):
+                    break
+                continue
+            group = busy['group'].get(a['group'], 0)
+            d, p = min(slots, key=lambda slot: (
+                (group & grid.day_rows[slot[0]]).bit_count(), grid.period_index[slot[1]],
+            ))
+            place(a, d, p)
+
+    unplaced = [
+        {'kind': 'unplaced', 'group': a['group'], 'subject': a['subject'],
+         'teacher': a['teacher'], 'need': a['hours'] - len(placed[a['id']])}
+        for a in pending if len(placed[a['id']]) < a['hours']
+    ]
+    return placed, unplaced
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import session
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from app import app, db
+from app.models import ClassGroup, Period, Room, Subject, Teacher, TimetableEntry, User
+
+# Everything the dashboard grid renders: the lessons, the period rows and
+# the names on the cards
+GRID_MODELS = (TimetableEntry, Period, Room, ClassGroup, Subject, Teacher)
+
+
+def _templates_digest():
+    # Part of every ETag, so a deploy that changes the page is not answered
+    # with 304 from a browser's copy of the old one
+    digest = hashlib.sha256()
+    for name in ('base.html', 'dashboard.html', 'dashboard_grid.html'):
+        with open(os.path.join(app.root_path, app.template_folder, name), 'rb') as fh:
+            digest.update(fh.read())
+    return digest.hexdigest()[:12]
+
+
+TEMPLATES_DIGEST = _templates_digest()
+
+
+def bump_timetable_version(user_id):
+    # For writes that bypass the mapper events below (bulk insert / update /
+    # delete statements); runs in the caller's transaction
+    db.session.execute(
+        update(User).where(User.id == user_id)
+        .values(timetable_version=User.timetable_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _touched(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('grid_users', set()).add(target.user_id)
+
+
+for _model in GRID_MODELS:
+    for _name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _name, _touched)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump(session, flush_context):
+    # One UPDATE per flush for every user whose grid it changed, in the same
+    # transaction as the change, so every worker and solver process sees the
+    # new version exactly when the change itself becomes visible
+    users = session.info.pop('grid_users', None)
+    if users:
+        table = User.__table__
+        session.connection().execute(
+            update(table).where(table.c.id.in_(users))
+            .values(timetable_version=table.c.timetable_version + 1)
+        )
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget(session):
+    session.info.pop('grid_users', None)
+
+
+class GridCache:
+    # The rendered grid of each user at one timetable version, in a
+    # per-process LRU of `size` users. A newer version simply misses, so
+    # nothing is ever invalidated.
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()  # user id -> (version, html)
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0}
+
+    def get(self, user_id, version):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[0] == version:
+                self.entries.move_to_end(user_id)
+                self.counters['hits'] += 1
+                return entry[1]
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, user_id, version, html):
+        with self.lock:
+            self.entries[user_id] = (version, html)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, size=len(self.entries))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # The process-wide cache sized by DASHBOARD_CACHE_SIZE, or None when it is off
+    global _cache
+    with _cache_lock:
+        if _cache is None and app.config['DASHBOARD_CACHE_SIZE'] > 0:
+            _cache = GridCache(app.config['DASHBOARD_CACHE_SIZE'])
+        return _cache
+
+
+def dashboard_etag(user, active_job):
+    # Weak ETag of the dashboard page, or None when it must not be reused: it
+    # covers the timetable version, the job the page polls, the templates and
+    # the session's CSRF token. That token is signed with a timestamp, so the
+    # tag also changes every half WTF_CSRF_TIME_LIMIT and a revalidated page
+    # never carries a token about to expire. Pending flash messages are shown
+    # once, so a page with them is always rendered.
+    token = session.get(app.config['WTF_CSRF_FIELD_NAME'])
+    if token is None or '_flashes' in session:
+        return None
+    limit = app.config['WTF_CSRF_TIME_LIMIT']
+    window = int(time.time() // (limit / 2)) if limit else 0
+    parts = (user.id, user.timetable_version, active_job.id if active_job else 0,
+             TEMPLATES_DIGEST, token, window)
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
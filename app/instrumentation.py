@@ -0,0 +1,130 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from ortools.sat.python import cp_model
+from sqlalchemy import case, func, select
+
+from app import app, db
+from app.models import GenerationJob, GenerationRun
+
+# Phases of a generation run, each a <phase>_s column of GenerationRun:
+# loading the inputs, the result cache, availability masks and counting
+# bounds, the greedy seed, model construction, CP-SAT, reading solutions
+# into schedule items, and writing the timetable back
+PHASES = ('load', 'cache', 'availability', 'seed', 'build', 'solve', 'extract', 'save')
+# Upper bounds (seconds) of the generation duration histogram
+DURATION_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+class RunMetrics:
+    # Timings, model size and solver statistics of one generation run, as
+    # GenerationRun column -> value. Components solved in parallel report
+    # from their own threads; their phase times add up, so phases can
+    # exceed the run's wall time.
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, amount):
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+    def set(self, name, value):
+        with self.lock:
+            self.values[name] = value
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(f'{name}_s', time.perf_counter() - start)
+
+    def record_search(self, model, solver, status, main=True):
+        # Effort of one CP-SAT search. A main search (not an LNS step) also
+        # counts towards model size, status, objective and bound: the status
+        # kept is the first that is not OPTIMAL, objective and bound add up
+        # over components.
+        with self.lock:
+            v = self.values
+            v['searches'] = v.get('searches', 0) + 1
+            v['conflicts'] = v.get('conflicts', 0) + solver.NumConflicts()
+            v['branches'] = v.get('branches', 0) + solver.NumBranches()
+            v['solver_wall_s'] = v.get('solver_wall_s', 0) + solver.WallTime()
+            if not main:
+                v['lns_steps'] = v.get('lns_steps', 0) + 1
+                return
+            proto = model.Proto()
+            v['variables'] = v.get('variables', 0) + len(proto.variables)
+            v['constraints'] = v.get('constraints', 0) + len(proto.constraints)
+            if v.get('solver_status') in (None, 'OPTIMAL'):
+                v['solver_status'] = solver.StatusName(status)
+            if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) and proto.HasField('objective'):
+                v['objective'] = v.get('objective', 0) + solver.ObjectiveValue()
+                v['bound'] = v.get('bound', 0) + solver.BestObjectiveBound()
+
+
+def prometheus_text():
+    # The GenerationRun table and the job queue in the Prometheus text
+    # format. Solves run in pool processes, so the numbers come from the
+    # database rather than from process memory, and every web worker
+    # serves the same totals. Counters only grow while runs are kept.
+    lines = []
+
+    def metric(name, kind, text, samples):
+        lines.append(f"# HELP classplaner_{name} {text}")
+        lines.append(f"# TYPE classplaner_{name} {kind}")
+        for suffix, labels, value in samples:
+            label = '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}' if labels else ''
+            lines.append(f"classplaner_{name}{suffix}{label} {float(value or 0)!r}")
+
+    R = GenerationRun
+    outcomes = db.session.execute(select(R.outcome, func.count()).group_by(R.outcome)).all()
+    statuses = db.session.execute(
+        select(R.solver_status, func.count()).where(R.solver_status.isnot(None)).group_by(R.solver_status)
+    ).all()
+    phases = [func.sum(getattr(R, f'{p}_s')) for p in PHASES]
+    buckets = [func.sum(case((R.total_s <= le, 1), else_=0)) for le in DURATION_BUCKETS]
+    totals = db.session.execute(select(
+        func.count(), func.sum(R.total_s), func.sum(case((R.cached, 1), else_=0)),
+        func.sum(R.searches), func.sum(R.lns_steps), func.sum(R.conflicts), func.sum(R.branches),
+        func.sum(R.solver_wall_s), *phases, *buckets,
+    )).one()
+    count, duration, cached, searches, lns_steps, conflicts, branches, solver_wall = totals[:8]
+    phase_sums = totals[8:8 + len(PHASES)]
+    bucket_counts = totals[8 + len(PHASES):]
+    last = R.query.filter(R.variables.isnot(None)).order_by(R.id.desc()).first()
+    queue = dict(db.session.execute(
+        select(GenerationJob.status, func.count())
+        .where(GenerationJob.status.in_(('queued', 'running')))
+        .group_by(GenerationJob.status)
+    ).all())
+
+    metric('generation_runs_total', 'counter', "Generation runs by outcome.",
+           [('', {'outcome': outcome}, n) for outcome, n in outcomes])
+    metric('generation_cached_runs_total', 'counter', "Generation runs answered from the result cache.",
+           [('', {}, cached)])
+    metric('generation_duration_seconds', 'histogram', "Wall time of generation runs.",
+           [('_bucket', {'le': f'{le:g}'}, n) for le, n in zip(DURATION_BUCKETS, bucket_counts)]
+           + [('_bucket', {'le': '+Inf'}, count), ('_sum', {}, duration), ('_count', {}, count)])
+    metric('generation_phase_seconds_total', 'counter', "Seconds spent in each phase of generation runs.",
+           [('', {'phase': p}, s) for p, s in zip(PHASES, phase_sums)])
+    metric('solver_searches_total', 'counter', "CP-SAT searches, LNS steps included.", [('', {}, searches)])
+    metric('solver_lns_steps_total', 'counter', "Large neighbourhood search re-solves.", [('', {}, lns_steps)])
+    metric('solver_conflicts_total', 'counter', "CP-SAT conflicts.", [('', {}, conflicts)])
+    metric('solver_branches_total', 'counter', "CP-SAT branches.", [('', {}, branches)])
+    metric('solver_wall_seconds_total', 'counter', "Wall time reported by CP-SAT.", [('', {}, solver_wall)])
+    metric('solver_status_total', 'counter', "Generation runs by CP-SAT status of their main search.",
+           [('', {'status': status}, n) for status, n in statuses])
+    if last:
+        metric('last_run_model_variables', 'gauge', "Variables of the latest run's models.",
+               [('', {}, last.variables)])
+        metric('last_run_model_constraints', 'gauge', "Constraints of the latest run's models.",
+               [('', {}, last.constraints)])
+    metric('generation_jobs', 'gauge', "Generation jobs waiting or running.",
+           [('', {'status': status}, queue.get(status, 0)) for status in ('queued', 'running')])
+    metric('solver_slots', 'gauge', "Concurrent solves allowed per host (SOLVER_MAX_CONCURRENT).",
+           [('', {}, app.config['SOLVER_MAX_CONCURRENT'])])
+    return '\n'.join(lines) + '\n'
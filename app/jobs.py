@@ -0,0 +1,312 @@
+import fcntl
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select, update
+
+from app import app, db
+from app.models import GenerationJob, GenerationRun
+from app.feasibility import Infeasible, explain
+from app.instrumentation import RunMetrics
+from app.schedule_generator import generate_schedule
+from app.solver_profiles import get_profile
+from app.timetable_store import TimetableChanged, entries_version, save_schedule
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+HEARTBEAT_SECONDS = 5
+ACCEPT_POLL_SECONDS = 1
+PROGRESS_THROTTLE_SECONDS = 1
+
+_executor = None
+_executor_pid = None
+_submitted = set()
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Web side: enqueue and report
+# ---------------------------------------------------------------------------
+
+def enqueue(user_id, mode='full'):
+    # A burst of "Generate" clicks collapses onto the job already in flight
+    job = active_job(user_id)
+    if job:
+        return job
+
+    job = GenerationJob(user_id=user_id, status='queued', mode=mode)
+    db.session.add(job)
+    db.session.commit()
+    _submit(job.id)
+    return job
+
+
+def active_job(user_id):
+    return (
+        GenerationJob.query
+        .filter(GenerationJob.user_id == user_id, GenerationJob.status.in_(ACTIVE_STATUSES))
+        .order_by(GenerationJob.id.desc())
+        .first()
+    )
+
+
+def resume_if_stalled(job):
+    # Called on every status poll: re-submits jobs that no live process owns,
+    # e.g. after the gunicorn worker that enqueued them was restarted.
+    if job.status == 'queued' or (job.status == 'running' and _is_stale(job)):
+        _submit(job.id)
+
+
+def accept(job):
+    # Ask the solver to stop and keep the best timetable found so far
+    if job.status in ACTIVE_STATUSES:
+        job.accept_requested = True
+        db.session.commit()
+
+
+def job_status(job):
+    if job.status in ACTIVE_STATUSES:
+        progress = min((job.wall_time or 0) / get_profile()['time_limit'], 0.99)
+    else:
+        progress = 1.0
+    return {
+        'id': job.id,
+        'status': job.status,
+        'mode': job.mode,
+        'progress': round(progress, 2),
+        'solutions': job.solutions,
+        'objective': job.objective,
+        'bound': job.bound,
+        'wall_time': job.wall_time,
+        'lessons': job.lessons,
+        'preserved': job.preserved,
+        'accept_requested': job.accept_requested,
+        'message': job.message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _is_stale(job):
+    stale_after = timedelta(seconds=app.config['JOB_STALE_SECONDS'])
+    return job.heartbeat_at is None or datetime.utcnow() - job.heartbeat_at > stale_after
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # spawn: the solver process must not inherit the web worker's
+            # DB connections or OR-Tools threads
+            _executor = ProcessPoolExecutor(
+                max_workers=app.config['SOLVER_MAX_CONCURRENT'],
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _executor_pid = os.getpid()
+            _submitted.clear()
+            recover = True
+        else:
+            recover = False
+    if recover:
+        _recover_jobs()
+    return _executor
+
+
+def _submit(job_id):
+    executor = _get_executor()
+    with _lock:
+        if job_id in _submitted:
+            return
+        _submitted.add(job_id)
+    future = executor.submit(run_job, job_id)
+    future.add_done_callback(lambda f: _submitted.discard(job_id))
+
+
+def _recover_jobs():
+    stale_before = datetime.utcnow() - timedelta(seconds=app.config['JOB_STALE_SECONDS'])
+    orphans = GenerationJob.query.filter(or_(
+        GenerationJob.status == 'queued',
+        (GenerationJob.status == 'running') & (GenerationJob.heartbeat_at < stale_before),
+    )).all()
+    for job in orphans:
+        logger.info("Resuming generation job %s (%s)", job.id, job.status)
+        _submit(job.id)
+
+
+# ---------------------------------------------------------------------------
+# Solver side: runs inside the process pool
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def solver_slot():
+    # Host-wide cap on concurrent solves, shared by every gunicorn worker's
+    # pool. flock is released by the kernel if the process dies.
+    lock_dir = app.config['SOLVER_LOCK_DIR']
+    os.makedirs(lock_dir, exist_ok=True)
+    while True:
+        for i in range(app.config['SOLVER_MAX_CONCURRENT']):
+            fh = open(os.path.join(lock_dir, f'classplaner-solver-{i}.lock'), 'w')
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fh.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+                fh.close()
+            return
+        time.sleep(0.5)
+
+
+def _claim(job_id):
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=app.config['JOB_STALE_SECONDS'])
+    result = db.session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id)
+        .where(or_(
+            GenerationJob.status == 'queued',
+            (GenerationJob.status == 'running') & (GenerationJob.heartbeat_at < stale_before),
+        ))
+        .values(status='running', started_at=now, heartbeat_at=now,
+                host=socket.gethostname(), solutions=0)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _touch(job_id, **fields):
+    # Own app context, so it is safe from the solver callback and heartbeat threads
+    with app.app_context():
+        fields['heartbeat_at'] = datetime.utcnow()
+        db.session.execute(update(GenerationJob).where(GenerationJob.id == job_id).values(**fields))
+        db.session.commit()
+
+
+def _heartbeat(job_id, stop, solvers, accepted):
+    # Keeps the job alive, and once the user accepts the current best, stops
+    # every solver the job has started (see generate_schedule's on_solver)
+    last_beat = time.monotonic()
+    while not stop.wait(ACCEPT_POLL_SECONDS):
+        try:
+            if not accepted.is_set():
+                with app.app_context():
+                    if db.session.execute(
+                        select(GenerationJob.accept_requested).where(GenerationJob.id == job_id)
+                    ).scalar():
+                        accepted.set()
+            if accepted.is_set():
+                for solver in solvers:
+                    solver.StopSearch()
+            if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+                last_beat = time.monotonic()
+                _touch(job_id)
+        except Exception:
+            logger.exception("Heartbeat failed for generation job %s", job_id)
+
+
+def run_job(job_id):
+    with app.app_context(), solver_slot():
+        if not _claim(job_id):
+            return
+        job = db.session.get(GenerationJob, job_id)
+        started = time.perf_counter()
+        metrics = RunMetrics()
+        outcome = 'error'
+
+        stop = threading.Event()
+        accepted = threading.Event()
+        solvers = []
+        threading.Thread(target=_heartbeat, args=(job_id, stop, solvers, accepted), daemon=True).start()
+        last_report = [0.0]
+        latest = {}
+
+        def on_progress(info):
+            latest.update(info)
+            now = time.monotonic()
+            if now - last_report[0] >= PROGRESS_THROTTLE_SECONDS:
+                last_report[0] = now
+                try:
+                    _touch(job_id, **info)
+                except Exception:
+                    logger.exception("Progress update failed for generation job %s", job_id)
+
+        try:
+            # Read before the generator loads the entries, so any entry the
+            # user moves, locks or deletes during the solve makes the save refuse
+            version = entries_version(job.user_id)
+            ok, sched, unplaced = generate_schedule(
+                job.user_id, on_progress=on_progress, incremental=job.mode == 'incremental',
+                explain=app.config['SOLVER_EXPLAIN_INFEASIBLE'], on_solver=solvers.append,
+                lns_lessons=app.config['SOLVER_LNS_LESSONS'], metrics=metrics,
+            )
+            if ok or unplaced:
+                # without a solver timetable, the greedy best effort is
+                # saved so the user has something to edit by hand
+                with metrics.phase('save'):
+                    inserted, moved, deleted = save_schedule(job.user_id, sched, expected_version=version)
+                outcome = 'partial' if unplaced else 'succeeded'
+                metrics.set('lessons', len(sched))
+                metrics.set('unplaced', sum(p['need'] for p in unplaced))
+                job.status = outcome
+                job.lessons = len(sched)
+                job.preserved = len(sched) - inserted - moved
+                if unplaced:
+                    headline = (
+                        f"No complete schedule was found; a best-effort schedule "
+                        f"leaving out {sum(p['need'] for p in unplaced)} lesson(s) was saved."
+                    )
+                elif accepted.is_set():
+                    headline = "Best schedule so far accepted!"
+                else:
+                    headline = "Schedule generated successfully!"
+                job.message = (
+                    headline + f" {job.preserved} of "
+                    f"{job.preserved + moved + deleted} lesson(s) kept their slot, "
+                    f"{moved} moved, {inserted} added, {deleted} removed."
+                )
+                if unplaced:
+                    job.message += " " + " ".join(explain(job.user_id, unplaced))
+            else:
+                outcome = 'failed'
+                job.status = 'failed'
+                job.message = "Could not find a valid schedule. Try relaxing your constraints."
+        except TimetableChanged:
+            outcome = 'failed'
+            job.status = 'failed'
+            job.message = (
+                "The timetable was changed while this schedule was being generated, "
+                "so it was not saved. Generate again to start from the current timetable."
+            )
+        except Infeasible as ex:
+            outcome = 'infeasible'
+            job.status = 'failed'
+            job.message = "No valid schedule exists. " + " ".join(explain(job.user_id, ex.problems))
+        except Exception as ex:
+            db.session.rollback()
+            logger.exception("Generation job %s crashed", job_id)
+            job = db.session.get(GenerationJob, job_id)
+            job.status = 'failed'
+            job.message = f"Schedule generation failed: {ex}"
+        finally:
+            stop.set()
+
+        for field, value in latest.items():
+            setattr(job, field, value)
+        job.finished_at = datetime.utcnow()
+        job.heartbeat_at = job.finished_at
+        db.session.add(GenerationRun(
+            job_id=job.id, user_id=job.user_id, mode=job.mode, outcome=outcome,
+            total_s=time.perf_counter() - started, **metrics.values,
+        ))
+        db.session.commit()
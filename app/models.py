@@ -1,3 +1,4 @@
+from datetime import datetime
 from app import db
 from flask_login import UserMixin
 
@@ -7,31 +8,81 @@ class_group_teacher = db.Table(
     db.Column('class_group_id', db.Integer, db.ForeignKey('class_group.id'), primary_key=True)
 )
 
+# Preferred / allowed periods: no rows means no restriction
+teacher_preferred_period = db.Table(
+    'teacher_preferred_period',
+    db.Column('teacher_id', db.Integer, db.ForeignKey('teacher.id'), primary_key=True),
+    db.Column('period_id', db.Integer, db.ForeignKey('period.id'), primary_key=True)
+)
+
+class_group_allowed_period = db.Table(
+    'class_group_allowed_period',
+    db.Column('class_group_id', db.Integer, db.ForeignKey('class_group.id'), primary_key=True),
+    db.Column('period_id', db.Integer, db.ForeignKey('period.id'), primary_key=True)
+)
+
+
+def day_mask(days):
+    # Weekdays 1-5 as a bitmask (bit d-1 for day d); None for "any day"
+    mask = 0
+    for d in days or ():
+        mask |= 1 << (int(d) - 1)
+    return mask or None
+
+
+def mask_days(mask):
+    return [d for d in range(1, 6) if mask and mask >> (d - 1) & 1]
+
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     hashed_password = db.Column(db.String(200), nullable=False)
+    # Bumped with every committed change to what the dashboard grid shows
+    # (app/grid_cache.py); keys the cached grid and the dashboard ETag
+    timetable_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped with every committed change to the timetable entries alone
+    # (app/timetable_store.py); a generation job refuses to save over a
+    # timetable whose entries changed while it was solving
+    entries_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 class Teacher(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     week_hours = db.Column(db.Integer, nullable=False)
-    preferred_days = db.Column(db.Text, nullable=True)
-    preferred_periods = db.Column(db.Text, nullable=True)
+    preferred_day_mask = db.Column(db.Integer, nullable=True)  # see day_mask(); NULL = any day
+    preferred_periods = db.relationship(
+        'Period', secondary=teacher_preferred_period, lazy=True, order_by='Period.start_time',
+        backref=db.backref('preferring_teachers', lazy=True)
+    )
 
     user = db.relationship('User', backref=db.backref('teachers', lazy=True))
 
+    @property
+    def preferred_days(self):
+        return mask_days(self.preferred_day_mask)
+
+    @preferred_days.setter
+    def preferred_days(self, days):
+        self.preferred_day_mask = day_mask(days)
+
 class ClassGroup(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(50), nullable=False)
     default_room_id = db.Column(db.Integer, db.ForeignKey('room.id'))
-    allowed_periods = db.Column(db.Text, nullable=True)
+    is_junior = db.Column(db.Boolean, nullable=False, default=False)  # prefers early lessons
+    allowed_periods = db.relationship(
+        'Period', secondary=class_group_allowed_period, lazy=True, order_by='Period.start_time',
+        backref=db.backref('allowing_class_groups', lazy=True)
+    )
     user = db.relationship('User', backref='class_groups')
     default_room = db.relationship('Room', backref='default_class_groups')
 
 class Subject(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='uq_subject_user_name'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -42,6 +93,8 @@ class Subject(db.Model):
     default_room = db.relationship('Room', backref=db.backref('default_subjects', lazy=True))
 
 class ScheduleAssignment(db.Model):
+    __table_args__ = (db.Index('ix_schedule_assignment_user_group', 'user_id', 'class_group_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     class_group_id = db.Column(db.Integer, db.ForeignKey('class_group.id'), nullable=False)
@@ -57,6 +110,8 @@ class ScheduleAssignment(db.Model):
     room = db.relationship('Room', backref=db.backref('subject_assignments', lazy=True))
 
 class Room(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='uq_room_user_name'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(50), nullable=False)
@@ -66,6 +121,8 @@ class Room(db.Model):
     user = db.relationship('User', backref=db.backref('rooms', lazy=True))
 
 class Period(db.Model):
+    __table_args__ = (db.Index('ix_period_user_start', 'user_id', 'start_time'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(50), nullable=False)
@@ -75,6 +132,8 @@ class Period(db.Model):
     user = db.relationship('User', backref=db.backref('periods', lazy=True))
 
 class TimetableEntry(db.Model):
+    __table_args__ = (db.Index('ix_timetable_entry_user_slot', 'user_id', 'weekday', 'period_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     class_group_id = db.Column(db.Integer, db.ForeignKey('class_group.id'), nullable=False)
@@ -93,3 +152,95 @@ class TimetableEntry(db.Model):
     period = db.relationship('Period', backref=db.backref('timetable_entries', lazy=True))
     user = db.relationship('User', backref=db.backref('timetable_entries', lazy=True))
 
+
+class GenerationJob(db.Model):
+    __table_args__ = (db.Index('ix_generation_job_user_status', 'user_id', 'status'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, succeeded, partial, failed
+    mode = db.Column(db.String(20), nullable=False, default='full')  # full, incremental
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    host = db.Column(db.String(255), nullable=True)
+    solutions = db.Column(db.Integer, nullable=False, default=0)
+    objective = db.Column(db.Float, nullable=True)
+    bound = db.Column(db.Float, nullable=True)
+    wall_time = db.Column(db.Float, nullable=True)
+    lessons = db.Column(db.Integer, nullable=True)
+    preserved = db.Column(db.Integer, nullable=True)  # lessons left in their previous slot
+    accept_requested = db.Column(db.Boolean, nullable=False, default=False)  # stop at the current best
+    message = db.Column(db.Text, nullable=True)
+
+    user = db.relationship('User', backref=db.backref('generation_jobs', lazy=True))
+
+
+class GenerationRun(db.Model):
+    # Where the time of one finished generation job went (app/instrumentation.py)
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('generation_job.id'), nullable=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    mode = db.Column(db.String(20), nullable=False, default='full')
+    outcome = db.Column(db.String(20), nullable=False)  # succeeded, partial, failed, infeasible, error
+    cached = db.Column(db.Boolean, nullable=False, default=False)  # answered from the result cache
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lessons = db.Column(db.Integer, nullable=True)
+    unplaced = db.Column(db.Integer, nullable=True)  # lessons a best-effort schedule left out
+    # seconds per phase (instrumentation.PHASES) and in total
+    total_s = db.Column(db.Float, nullable=True)
+    load_s = db.Column(db.Float, nullable=True)
+    cache_s = db.Column(db.Float, nullable=True)
+    availability_s = db.Column(db.Float, nullable=True)
+    seed_s = db.Column(db.Float, nullable=True)
+    build_s = db.Column(db.Float, nullable=True)
+    solve_s = db.Column(db.Float, nullable=True)
+    extract_s = db.Column(db.Float, nullable=True)
+    save_s = db.Column(db.Float, nullable=True)
+    # model size of the main searches, summed over components
+    variables = db.Column(db.Integer, nullable=True)
+    constraints = db.Column(db.Integer, nullable=True)
+    # CP-SAT effort over all searches, LNS steps included
+    searches = db.Column(db.Integer, nullable=True)
+    lns_steps = db.Column(db.Integer, nullable=True)
+    conflicts = db.Column(db.BigInteger, nullable=True)
+    branches = db.Column(db.BigInteger, nullable=True)
+    solver_wall_s = db.Column(db.Float, nullable=True)
+    solver_status = db.Column(db.String(20), nullable=True)
+    objective = db.Column(db.Float, nullable=True)
+    bound = db.Column(db.Float, nullable=True)
+
+    job = db.relationship('GenerationJob', backref=db.backref('runs', lazy=True))
+
+
+# Weights of the soft constraints in app/objective.py (0 switches one off)
+SOLVER_DEFAULTS = {
+    'teacher_gaps': 3,
+    'unpreferred_periods': 5,
+    'subject_spread': 2,
+    'junior_late': 4,
+    'junior_periods': 5,
+    'soft_preferences': False,
+}
+
+class SolverSettings(db.Model):
+    # One row per user; users without a row solve with SOLVER_DEFAULTS
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    teacher_gaps = db.Column(db.Integer, nullable=False, default=SOLVER_DEFAULTS['teacher_gaps'])
+    unpreferred_periods = db.Column(db.Integer, nullable=False, default=SOLVER_DEFAULTS['unpreferred_periods'])
+    subject_spread = db.Column(db.Integer, nullable=False, default=SOLVER_DEFAULTS['subject_spread'])
+    junior_late = db.Column(db.Integer, nullable=False, default=SOLVER_DEFAULTS['junior_late'])
+    junior_periods = db.Column(db.Integer, nullable=False, default=SOLVER_DEFAULTS['junior_periods'])  # later periods are late
+    soft_preferences = db.Column(db.Boolean, nullable=False, default=SOLVER_DEFAULTS['soft_preferences'])  # teacher preferences become penalties
+
+    user = db.relationship('User', backref=db.backref('solver_settings', uselist=False))
+
+    def __init__(self, **kwargs):
+        # Defaults up front, so an unsaved row reads like a stored one
+        super().__init__(**{**SOLVER_DEFAULTS, **kwargs})
+
+    @classmethod
+    def for_user(cls, user_id):
+        return cls.query.filter_by(user_id=user_id).first() or cls(user_id=user_id)
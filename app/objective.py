@@ -0,0 +1,180 @@
+from ortools.sat.python import cp_model
+
+from app.availability import week_grid
+from app.models import SOLVER_DEFAULTS
+
+# Penalties add_objective() knows, in the order the settings page lists them
+PENALTIES = ('teacher_gaps', 'unpreferred_periods', 'subject_spread', 'junior_late')
+
+
+def weights_of(settings):
+    # Solver input form of a SolverSettings row
+    return {name: getattr(settings, name) for name in PENALTIES}
+
+
+def add_objective(model, x, data, hints=None):
+    # Minimise the weighted soft-constraint penalties over the decision
+    # variables x[(assignment_id, day, period)]. A zero weight adds nothing;
+    # returns False when no penalty applies and the model stays a pure
+    # feasibility problem that stops at its first solution. With `hints`
+    # (x keys of the current timetable), every lesson leaving its slot costs
+    # 1, so among equally good timetables the current one wins.
+    weights = data.get('weights') or {}
+    grid = week_grid(data)
+    assignments = {a['id']: a for a in data['assignments']}
+    terms, coefficients = [], []
+
+    def penalise(weight, variables):
+        terms.extend(variables)
+        coefficients.extend([weight] * len(variables))
+
+    # Idle periods between a teacher's first and last lesson of a day
+    if weights.get('teacher_gaps'):
+        busy = {}  # (teacher, day) -> {period: vars}
+        for (aid, d, p), var in x.items():
+            t_id = assignments[aid]['teacher']
+            if t_id in data['teachers']:
+                busy.setdefault((t_id, d), {}).setdefault(p, []).append(var)
+        fixed = (data.get('blocked') or {}).get('teacher', {})
+        for (t_id, d), slots in busy.items():
+            row = [
+                1 if grid.bit(d, p) & fixed.get(t_id, 0) else _sum(slots.get(p))
+                for p in data['period_ids']
+            ]
+            if sum(1 for busy_p in row if not _fixed(busy_p, 0)) > 1:
+                penalise(weights['teacher_gaps'], _gaps(model, row))
+
+    # Lessons outside the teacher's preferred days / periods; only possible
+    # when preferences are soft and so not part of the variable domains
+    if weights.get('unpreferred_periods'):
+        for (aid, d, p), var in x.items():
+            teacher = data['teachers'].get(assignments[aid]['teacher'])
+            if teacher and not grid.bit(d, p) & grid.mask(
+                    teacher.get('preferred_days'), teacher.get('preferred_periods')):
+                penalise(weights['unpreferred_periods'], [var])
+
+    # The same subject on consecutive days, for a more even spread
+    if weights.get('subject_spread'):
+        by_day = {}  # aid -> {day: vars}
+        for (aid, d, p), var in x.items():
+            by_day.setdefault(aid, {}).setdefault(d, []).append(var)
+        for aid, days in by_day.items():
+            locked = assignments[aid].get('blocked_days') or ()
+            held = [1 if d in locked else _sum(days.get(d)) for d in data['days']]
+            for today, tomorrow in zip(held, held[1:]):
+                if _fixed(today, 0) or _fixed(tomorrow, 0) or (_fixed(today, 1) and _fixed(tomorrow, 1)):
+                    continue
+                adjacent = model.NewBoolVar(f"adjacent_{aid}_{len(terms)}")
+                model.Add(adjacent >= today + tomorrow - 1)
+                penalise(weights['subject_spread'], [adjacent])
+
+    # Junior groups' lessons after their first `junior_periods` periods
+    if weights.get('junior_late'):
+        late = set(data['period_ids'][data.get('junior_periods', SOLVER_DEFAULTS['junior_periods']):])
+        penalise(weights['junior_late'], [
+            var for (aid, d, p), var in x.items()
+            if p in late and assignments[aid].get('junior')
+        ])
+
+    if not terms:
+        return False
+    kept = [x[key] for key in hints or () if key in x]
+    # counted as lessons moved rather than kept, so the objective the UI
+    # shows never drops below zero
+    model.Minimize(
+        cp_model.LinearExpr.WeightedSum(terms + kept, coefficients + [-1] * len(kept)) + len(kept)
+    )
+    return True
+
+
+def penalty(data, placed):
+    # The penalties add_objective() minimises, evaluated for a complete
+    # timetable {assignment id: {(day, period)}} of `data`, fixed occupancy
+    # included. Lessons that are fixed in the model add a constant here, so
+    # two timetables of the same input compare like their objectives.
+    weights = data.get('weights') or {}
+    grid = week_grid(data)
+    assignments = {a['id']: a for a in data['assignments']}
+    total = 0
+
+    if weights.get('teacher_gaps'):
+        busy = {
+            t_id: mask for t_id, mask in ((data.get('blocked') or {}).get('teacher') or {}).items()
+            if t_id in data['teachers']
+        }
+        for aid, slots in placed.items():
+            t_id = assignments[aid]['teacher']
+            if t_id in data['teachers']:
+                for d, p in slots:
+                    busy[t_id] = busy.get(t_id, 0) | grid.bit(d, p)
+        row_mask = (1 << grid.width) - 1
+        for mask in busy.values():
+            for _ in grid.days:
+                row = mask & row_mask
+                mask >>= grid.width
+                if row & (row - 1):
+                    # idle periods between the first and the last lesson
+                    span = row.bit_length() - ((row & -row).bit_length() - 1)
+                    total += weights['teacher_gaps'] * (span - bin(row).count('1'))
+
+    if weights.get('unpreferred_periods'):
+        for aid, slots in placed.items():
+            teacher = data['teachers'].get(assignments[aid]['teacher'])
+            if teacher:
+                preferred = grid.mask(teacher.get('preferred_days'), teacher.get('preferred_periods'))
+                total += weights['unpreferred_periods'] * sum(
+                    1 for d, p in slots if not grid.bit(d, p) & preferred
+                )
+
+    if weights.get('subject_spread'):
+        for aid, slots in placed.items():
+            held = {d for d, _ in slots} | set(assignments[aid].get('blocked_days') or ())
+            total += weights['subject_spread'] * sum(
+                1 for today, tomorrow in zip(data['days'], data['days'][1:])
+                if today in held and tomorrow in held
+            )
+
+    if weights.get('junior_late'):
+        late = set(data['period_ids'][data.get('junior_periods', SOLVER_DEFAULTS['junior_periods']):])
+        total += weights['junior_late'] * sum(
+            1 for aid, slots in placed.items() if assignments[aid].get('junior')
+            for _, p in slots if p in late
+        )
+
+    return total
+
+
+def _sum(variables):
+    # 0 (the int) when no variable can fill the slot, so callers can skip it
+    return cp_model.LinearExpr.Sum(variables) if variables else 0
+
+
+def _fixed(value, constant):
+    # True if `value` is the plain int `constant` rather than an expression
+    return isinstance(value, int) and value == constant
+
+
+def _gaps(model, row):
+    # Gap indicators for one teacher-day, `row` holding per period 0, 1 or
+    # the sum of the lesson variables there. before[i] / after[i] say a lesson
+    # happens at or before / at or after period i; they are only bounded from
+    # below, which is exact while the objective pushes them down.
+    n = len(row)
+    before = [model.NewBoolVar(f"before_{i}") for i in range(n)]
+    after = [model.NewBoolVar(f"after_{i}") for i in range(n)]
+    for i, busy in enumerate(row):
+        if not _fixed(busy, 0):
+            model.Add(before[i] >= busy)
+            model.Add(after[i] >= busy)
+        if i:
+            model.Add(before[i] >= before[i - 1])
+            model.Add(after[i - 1] >= after[i])
+
+    gaps = []
+    for i in range(1, n - 1):
+        if _fixed(row[i], 1):
+            continue
+        gap = model.NewBoolVar(f"gap_{i}")
+        model.Add(gap >= before[i - 1] + after[i + 1] - 1 - row[i])
+        gaps.append(gap)
+    return gaps
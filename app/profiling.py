@@ -0,0 +1,152 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import app
+
+logger = logging.getLogger(__name__)
+
+# cProfile summaries kept for the report page, newest first
+KEEP_DUMPS = 20
+# Functions listed per summary, by cumulative time
+DUMP_LINES = 25
+
+_lock = threading.Lock()
+_endpoints = {}  # endpoint -> totals of the profiled requests this process served
+_dumps = deque(maxlen=KEEP_DUMPS)
+
+
+def is_admin(user):
+    return user.is_authenticated and user.username in app.config['PROFILER_ADMINS']
+
+
+def enabled():
+    return app.config['PROFILE_REQUESTS'] or bool(app.config['PROFILER_ADMINS'])
+
+
+@app.before_request
+def _start():
+    # Profiles every request with PROFILE_REQUESTS, otherwise only those of
+    # PROFILER_ADMINS sending "X-Profile: 1", which always get a cProfile
+    # dump; of the others, PROFILER_SAMPLE_RATE do
+    if not enabled():
+        return
+    asked = request.headers.get('X-Profile') == '1' and is_admin(current_user)
+    if not (app.config['PROFILE_REQUESTS'] or asked):
+        return
+    g.profile = {'statements': 0, 'db_s': 0.0, 'status': 500, 'profiler': None}
+    if asked or random.random() < app.config['PROFILER_SAMPLE_RATE']:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            g.profile['profiler'] = profiler
+        except ValueError:
+            # Python 3.12+ allows one profiler per process: a concurrent
+            # request already has it, this one is only timed
+            pass
+    g.profile['started'] = time.perf_counter()
+
+
+@app.after_request
+def _status(response):
+    if 'profile' in g:
+        g.profile['status'] = response.status_code
+    return response
+
+
+@app.teardown_request
+def _finish(exc):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    wall_s = time.perf_counter() - profile['started']
+    profiler = profile['profiler']
+    if profiler:
+        profiler.disable()
+    # one row for every URL no route matched, however many there are
+    endpoint = request.endpoint or '<unmatched>'
+    logger.info(
+        "%s %s %s in %.1f ms, %d SQL statement(s), %.1f ms in the database",
+        request.method, endpoint, profile['status'], wall_s * 1000,
+        profile['statements'], profile['db_s'] * 1000,
+    )
+    with _lock:
+        totals = _endpoints.setdefault(endpoint, {
+            'requests': 0, 'errors': 0, 'wall_s': 0.0, 'max_wall_s': 0.0,
+            'statements': 0, 'max_statements': 0, 'db_s': 0.0,
+        })
+        totals['requests'] += 1
+        totals['errors'] += profile['status'] >= 500
+        totals['wall_s'] += wall_s
+        totals['max_wall_s'] = max(totals['max_wall_s'], wall_s)
+        totals['statements'] += profile['statements']
+        totals['max_statements'] = max(totals['max_statements'], profile['statements'])
+        totals['db_s'] += profile['db_s']
+    if profiler:
+        _dump(profiler, endpoint, wall_s)
+
+
+def _dump(profiler, endpoint, wall_s):
+    # Writes the .prof file (snakeviz, pstats) and keeps a text summary
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    name = re.sub(r'[^\w.-]', '_', endpoint)
+    path = os.path.join(app.config['PROFILER_DUMP_DIR'], f'{name}-{stamp}-{os.getpid()}.prof')
+    try:
+        os.makedirs(app.config['PROFILER_DUMP_DIR'], exist_ok=True)
+        profiler.dump_stats(path)
+    except OSError:
+        logger.exception("Could not write profile %s", path)
+        path = None
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(DUMP_LINES)
+    with _lock:
+        _dumps.appendleft({
+            'endpoint': endpoint, 'at': datetime.utcnow(), 'wall_s': wall_s,
+            'path': path, 'summary': text.getvalue(),
+        })
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'profile' in g:
+        conn.info['profile_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('profile_started', None)
+    if started is not None and has_request_context() and 'profile' in g:
+        g.profile['statements'] += 1
+        g.profile['db_s'] += time.perf_counter() - started
+
+
+def report():
+    # Per-endpoint averages of this process, slowest mean first, and the
+    # latest cProfile summaries. Each gunicorn worker keeps its own; the log
+    # line per profiled request covers all of them.
+    with _lock:
+        rows = [
+            dict(totals, endpoint=endpoint,
+                 mean_ms=totals['wall_s'] / totals['requests'] * 1000,
+                 max_ms=totals['max_wall_s'] * 1000,
+                 mean_statements=totals['statements'] / totals['requests'],
+                 mean_db_ms=totals['db_s'] / totals['requests'] * 1000,
+                 db_share=totals['db_s'] / totals['wall_s'] if totals['wall_s'] else 0)
+            for endpoint, totals in _endpoints.items()
+        ]
+        dumps = list(_dumps)
+    rows.sort(key=lambda row: row['mean_ms'], reverse=True)
+    return {'pid': os.getpid(), 'endpoints': rows, 'dumps': dumps}
@@ -0,0 +1,196 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from sqlalchemy import event, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from app import app, db
+from app.models import ClassGroup, Period, Room, Subject, Teacher
+
+logger = logging.getLogger(__name__)
+
+# The dropdown sources of the forms, each a list of (id, label): periods in
+# time order with their times in the label, the others by id
+REFERENCE_MODELS = {
+    'periods': Period,
+    'rooms': Room,
+    'class_groups': ClassGroup,
+    'subjects': Subject,
+    'teachers': Teacher,
+}
+
+
+def load_reference(user_id):
+    # Every reference list of a user in a single statement
+    parts = [
+        select(
+            literal(kind).label('kind'), model.id, model.name,
+            (model.start_time if model is Period else null()).label('start_time'),
+            (model.end_time if model is Period else null()).label('end_time'),
+        ).where(model.user_id == user_id)
+        for kind, model in REFERENCE_MODELS.items()
+    ]
+    rows = db.session.execute(union_all(*parts)).all()
+    lists = {kind: [] for kind in REFERENCE_MODELS}
+    for row in sorted(rows, key=lambda row: row.id):
+        lists[row.kind].append(row)
+    lists['periods'].sort(key=lambda p: p.start_time)
+    return {
+        kind: [
+            (r.id, f"{r.name} ({r.start_time.strftime('%H:%M')}–{r.end_time.strftime('%H:%M')})"
+             if kind == 'periods' else r.name)
+            for r in rows
+        ]
+        for kind, rows in lists.items()
+    }
+
+
+class ReferenceCache:
+    # Reference lists per user: an LRU in process memory whose entries
+    # expire after `ttl` seconds. Each entry carries a version token. Writes
+    # bump a process-local generation, plus, with `path`, a per-user counter
+    # in a SQLite file every worker on the host reads, so a change made
+    # through one gunicorn worker is seen by all of them at once rather
+    # than after the TTL.
+    def __init__(self, size, ttl, path=None):
+        self.size = size
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()  # user id -> (stored at, token, lists)
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        if path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS versions "
+                        "(user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)"
+                    )
+            except sqlite3.Error:
+                logger.exception("Reference cache file %s unusable, invalidating this process only", path)
+                self.path = None
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, user_id):
+        # (lists or None, token); a miss is stored back with that token, so
+        # lists loaded while a write commits are never kept as current
+        token = (self.generations.get(user_id, 0), self._shared_version(user_id))
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[1] == token and time.monotonic() - entry[0] < self.ttl:
+                self.entries.move_to_end(user_id)
+                self.counters['hits'] += 1
+                return entry[2], token
+            self.counters['misses'] += 1
+        return None, token
+
+    def store(self, user_id, token, lists):
+        with self.lock:
+            if token[0] != self.generations.get(user_id, 0) or token[1] < 0:
+                return
+            self.entries[user_id] = (time.monotonic(), token, lists)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self.generations[user_id] = self.generations.get(user_id, 0) + 1
+                self.entries.pop(user_id, None)
+                self.counters['invalidations'] += 1
+        if self.path:
+            try:
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT INTO versions (user_id, version) VALUES (?, 1) "
+                        "ON CONFLICT(user_id) DO UPDATE SET version = version + 1",
+                        [(user_id,) for user_id in user_ids],
+                    )
+            except sqlite3.Error:
+                logger.exception("Reference cache version bump failed")
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, size=len(self.entries))
+
+    def _shared_version(self, user_id):
+        if not self.path:
+            return 0
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT version FROM versions WHERE user_id = ?", (user_id,)).fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error:
+            # unknown version: a token no entry has, i.e. read through
+            logger.exception("Reference cache version read failed")
+            return -1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # The process-wide cache configured by REFERENCE_CACHE_SIZE, _TTL and
+    # _PATH, or None when it is off
+    global _cache
+    with _cache_lock:
+        if _cache is None and app.config['REFERENCE_CACHE_SIZE'] > 0:
+            _cache = ReferenceCache(
+                app.config['REFERENCE_CACHE_SIZE'], app.config['REFERENCE_CACHE_TTL'],
+                app.config['REFERENCE_CACHE_PATH'] or None,
+            )
+        return _cache
+
+
+def reference_data(user_id):
+    # {kind: [(id, label)]} for the dropdowns, as fresh lists the caller may
+    # extend; at most one query, none on a hit
+    cache = get_cache()
+    if cache is None:
+        return load_reference(user_id)
+    lists, token = cache.lookup(user_id)
+    if lists is None:
+        lists = load_reference(user_id)
+        cache.store(user_id, token, lists)
+    return {kind: list(rows) for kind, rows in lists.items()}
+
+
+def _touched(mapper, connection, target):
+    # Remember whose lists the flush changed; they are dropped on commit,
+    # so a rolled-back change never invalidates and a committed one always does
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('reference_users', set()).add(target.user_id)
+
+
+for _model in REFERENCE_MODELS.values():
+    for _name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _name, _touched)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate(session):
+    users = session.info.pop('reference_users', None)
+    cache = get_cache()
+    if users and cache:
+        cache.invalidate(users)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget(session):
+    session.info.pop('reference_users', None)
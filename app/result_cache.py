@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app import app
+
+logger = logging.getLogger(__name__)
+
+# Part of every fingerprint: bump it when the generator would place lessons
+# differently for the same inputs, so old results stop matching
+CACHE_VERSION = 1
+
+
+def fingerprint(data, entries, options):
+    # Canonical SHA-256 of everything a solve depends on: the solver input
+    # (load_inputs), the current entries without their row ids, and the
+    # options (mode, resolved profile, ...). Lists whose order means nothing
+    # are sorted, so the hash does not depend on query order.
+    def ordered(values):
+        return None if values is None else sorted(values)
+
+    def rows(values):
+        # rows may mix None and ints, which do not compare
+        return sorted(values, key=json.dumps)
+
+    canonical = {
+        'version': CACHE_VERSION,
+        'days': data['days'],
+        'period_ids': data['period_ids'],  # in time order, which matters
+        'teachers': rows(
+            [t_id, t['week_hours'], ordered(t['days']), ordered(t['periods']),
+             ordered(t.get('preferred_days')), ordered(t.get('preferred_periods'))]
+            for t_id, t in data['teachers'].items()
+        ),
+        'assignments': sorted(
+            ([a['id'], a['group'], a['subject'], a['teacher'], a['hours'], a['room'],
+              sorted(a['group_allowed']), bool(a.get('junior'))] for a in data['assignments']),
+            key=lambda row: row[0],
+        ),
+        'weights': data.get('weights'),
+        'junior_periods': data.get('junior_periods'),
+        'entries': rows(
+            [e['group'], e['subject'], e['teacher'], e['room'], e['weekday'], e['period'], e['locked']]
+            for e in entries
+        ),
+        'options': options,
+    }
+    text = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache:
+    # Bounded LRU of solve results by fingerprint: in memory, plus an
+    # optional SQLite file that every solver process on the host shares and
+    # that survives restarts. Values must be JSON-serialisable.
+    def __init__(self, size, path=None):
+        self.size = size
+        self.path = path
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+        if path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS results "
+                        "(key TEXT PRIMARY KEY, value TEXT NOT NULL, used_at REAL NOT NULL)"
+                    )
+            except sqlite3.Error:
+                logger.exception("Result cache file %s unusable, keeping results in memory only", path)
+                self.path = None
+
+    @contextmanager
+    def _connect(self):
+        # one short transaction per call, so threads and processes never
+        # share a connection
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return self.memory[key]
+        value = self._disk_get(key) if self.path else None
+        with self.lock:
+            if value is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['disk_hits'] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.counters['stores'] += 1
+            self._remember(key, value)
+        if self.path:
+            self._disk_put(key, value)
+
+    def stats(self):
+        with self.lock:
+            hits = self.counters['memory_hits'] + self.counters['disk_hits']
+            return dict(self.counters, hits=hits, size=len(self.memory))
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        # A broken or locked cache file costs a solve, never the job
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE results SET used_at = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+        except sqlite3.Error:
+            logger.exception("Result cache read failed")
+            return None
+
+    def _disk_put(self, key, value):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, used_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+                conn.execute(
+                    "DELETE FROM results WHERE key NOT IN "
+                    "(SELECT key FROM results ORDER BY used_at DESC LIMIT ?)",
+                    (self.size,),
+                )
+        except sqlite3.Error:
+            logger.exception("Result cache write failed")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # The process-wide cache configured by SOLVER_CACHE_SIZE and
+    # SOLVER_CACHE_PATH, or None when caching is off
+    global _cache
+    with _cache_lock:
+        if _cache is None and app.config['SOLVER_CACHE_SIZE'] > 0:
+            _cache = ResultCache(app.config['SOLVER_CACHE_SIZE'], app.config['SOLVER_CACHE_PATH'] or None)
+        return _cache
+
+
+def stats():
+    # Hit / miss counters of this process's cache
+    cache = get_cache()
+    return cache.stats() if cache else {}
@@ -1,10 +1,34 @@
-from flask import render_template, request, redirect, url_for, flash
+import hmac
+
+from flask import render_template, request, redirect, url_for, flash, jsonify, abort, Response, make_response
 from flask_login import login_user, login_required, logout_user, current_user
+from markupsafe import Markup
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload, selectinload
 from app import app, db, login_manager
-from app.schedule_generator import generate_schedule
-from app.models import Teacher, Subject, User, ClassGroup, Room, Period, TimetableEntry, ScheduleAssignment
-from app.forms import TeacherForm, SubjectForm, RegisterForm, LoginForm, ClassGroupForm, RoomForm, PeriodForm, TimetableEntryForm, ScheduleAssignmentForm
+from app import jobs
+from app.grid_cache import dashboard_etag, get_cache as get_grid_cache
+from app.instrumentation import prometheus_text
+from app.profiling import is_admin, report
+from app.reference_cache import reference_data
+from app.models import Teacher, Subject, User, ClassGroup, Room, Period, TimetableEntry, ScheduleAssignment, GenerationJob, SolverSettings
+from app.timetable_store import bump_entries_version, describe_conflicts, free_slots, move_conflicts
+from app.forms import TeacherForm, SubjectForm, RegisterForm, LoginForm, ClassGroupForm, RoomForm, PeriodForm, TimetableEntryForm, ScheduleAssignmentForm, SolverSettingsForm
+
+# Loader options for the names every lesson card / list row renders, so a
+# page is a fixed number of queries instead of one lazy load per relation
+ENTRY_NAMES = (
+    joinedload(TimetableEntry.class_group),
+    joinedload(TimetableEntry.subject),
+    joinedload(TimetableEntry.teacher),
+    joinedload(TimetableEntry.room),
+)
+ASSIGNMENT_NAMES = (
+    joinedload(ScheduleAssignment.class_group),
+    joinedload(ScheduleAssignment.subject),
+    joinedload(ScheduleAssignment.teacher),
+    joinedload(ScheduleAssignment.room),
+)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -18,28 +42,104 @@ def home():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    periods = Period.query.filter_by(user_id=current_user.id).order_by(Period.start_time).all()
-    entries = TimetableEntry.query.filter_by(user_id=current_user.id).all()
-    grid = {}
-    for e in entries:
-        key = (e.weekday, e.period_id)
-        grid.setdefault(key, []).append(e)
-    return render_template('dashboard.html', periods=periods, grid=grid)
+    # The poller comes back here with ?finished=<job> once a generation has
+    # saved a timetable, to show its message: how many lessons kept their
+    # slot and, for a partial one, which lessons are missing
+    finished = request.args.get('finished', type=int)
+    if finished is not None:
+        job = GenerationJob.query.filter_by(id=finished, user_id=current_user.id).first()
+        if job and job.status in ('succeeded', 'partial'):
+            flash(job.message, 'success' if job.status == 'succeeded' else 'danger')
+        return redirect(url_for('dashboard'))
+
+    # A repeat visit with an unchanged timetable is answered 304 from the
+    # user row and the active job alone; otherwise the grid comes from the
+    # per-version cache and only a new version queries and renders it
+    active_job = jobs.active_job(current_user.id)
+    etag = dashboard_etag(current_user, active_job)
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        version = current_user.timetable_version
+        cache = get_grid_cache()
+        grid_html = cache.get(current_user.id, version) if cache else None
+        if grid_html is None:
+            periods = Period.query.filter_by(user_id=current_user.id).order_by(Period.start_time).all()
+            entries = TimetableEntry.query.filter_by(user_id=current_user.id).options(*ENTRY_NAMES).all()
+            grid = {}
+            for e in entries:
+                key = (e.weekday, e.period_id)
+                grid.setdefault(key, []).append(e)
+            grid_html = Markup(render_template('dashboard_grid.html', periods=periods, grid=grid))
+            if cache:
+                cache.put(current_user.id, version, grid_html)
+        response = make_response(render_template('dashboard.html', grid_html=grid_html, active_job=active_job))
+    if etag:
+        response.set_etag(etag, weak=True)
+    # the browser must ask every time; the ETag makes that cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/move-entry', methods=['POST'])
 @login_required
 def move_timetable_entry():
-    data = request.get_json()
-    e = TimetableEntry.query.filter_by(
-          id=data["entry_id"], user_id=current_user.id
-        ).first_or_404()
+    return _apply_moves([request.get_json()])
+
+@app.route('/move-entries', methods=['POST'])
+@login_required
+def move_timetable_entries():
+    # Several cards at once (swaps, multi-select drags): validated together
+    # and committed in one transaction, so no invalid state is ever stored
+    payload = request.get_json()
+    return _apply_moves(payload.get("moves") if isinstance(payload, dict) else None)
+
+@app.route('/free-slots/<int:entry_id>')
+@login_required
+def entry_free_slots(entry_id):
+    # Cells the dashboard highlights while this card is dragged
+    entry = TimetableEntry.query.filter_by(id=entry_id, user_id=current_user.id).first_or_404()
+    return jsonify({"slots": free_slots(current_user.id, entry)})
+
+def _apply_moves(moves):
+    if not isinstance(moves, list) or not all(isinstance(m, dict) for m in moves):
+        return {"success": False, "error": "Malformed move."}, 400
+    try:
+        targets = {int(m["entry_id"]): (int(m["weekday"]), int(m["period_id"])) for m in moves}
+    except (KeyError, TypeError, ValueError):
+        return {"success": False, "error": "Malformed move."}, 400
+    if not targets:
+        return {"success": False, "error": "Nothing to move."}, 400
+
+    entries = (
+        TimetableEntry.query
+        .filter(TimetableEntry.user_id == current_user.id, TimetableEntry.id.in_(targets))
+        .options(*ENTRY_NAMES)
+        .all()
+    )
+    if len(entries) != len(targets):
+        abort(404)
+    period_ids = {p for _, p in targets.values()}
+    known = Period.query.filter(Period.user_id == current_user.id, Period.id.in_(period_ids)).count()
+    if known != len(period_ids) or any(d not in range(1, 6) for d, _ in targets.values()):
+        return {"success": False, "error": "Unknown day or period."}, 400
+
+    # refuse double bookings instead of silently creating them
+    conflicts = move_conflicts(current_user.id, entries, targets)
+    if conflicts:
+        return {
+            "success": False,
+            "error": "Slot already taken by " + "; ".join(
+                f"{o.class_group.name} {o.subject.name} ({', '.join(kinds)})" for _, o, kinds in conflicts
+            ),
+            "conflicts": describe_conflicts(conflicts),
+        }, 409
 
     # apply the change
-    e.weekday   = data["weekday"]
-    e.period_id = data["period_id"]
+    for e in entries:
+        e.weekday, e.period_id = targets[e.id]
     try:
         db.session.commit()
-        return {"success": True}
+        return {"success": True, "moved": len(entries)}
     except Exception as ex:
         db.session.rollback()
         return {"success": False, "error": str(ex)}, 400
@@ -85,11 +185,19 @@ def logout():
 @app.route('/teachers')
 @login_required
 def teacher_list():
-    teachers = Teacher.query.filter_by(user_id=current_user.id).all()
-    periods = Period.query.filter_by(user_id=current_user.id).all()
-    periods_dict = {p.id: p for p in periods}
+    teachers = (
+        Teacher.query
+        .filter_by(user_id=current_user.id)
+        .options(selectinload(Teacher.preferred_periods))
+        .all()
+    )
+    return render_template('teacher_list.html', teachers=teachers)
 
-    return render_template('teacher_list.html', teachers=teachers, periods_dict=periods_dict)
+def _user_periods(period_ids):
+    # Period rows for ids picked in a form, restricted to the current user
+    if not period_ids:
+        return []
+    return Period.query.filter(Period.user_id == current_user.id, Period.id.in_(period_ids)).all()
 
 @app.route('/add-teacher', methods=['GET', 'POST'])
 @login_required
@@ -97,18 +205,15 @@ def add_teacher():
     form = TeacherForm()
 
     # Populate preferred periods choices
-    form.preferred_periods.choices = [
-        (p.id, f"{p.name} ({p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')})") 
-        for p in Period.query.filter_by(user_id=current_user.id).all()
-    ]
+    form.preferred_periods.choices = reference_data(current_user.id)['periods']
 
     if form.validate_on_submit():
         teacher = Teacher(
             user_id=current_user.id,
             name=form.name.data.strip(),
             week_hours=form.week_hours.data,
-            preferred_days=','.join(map(str, form.preferred_days.data)) or None,
-            preferred_periods=','.join(map(str, form.preferred_periods.data)) or None
+            preferred_days=form.preferred_days.data,
+            preferred_periods=_user_periods(form.preferred_periods.data)
         )
 
         db.session.add(teacher)
@@ -126,26 +231,21 @@ def edit_teacher(teacher_id):
     form = TeacherForm(obj=teacher)
 
     # Populate preferred periods choices
-    form.preferred_periods.choices = [
-        (p.id, f"{p.name} ({p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')})") 
-        for p in Period.query.filter_by(user_id=current_user.id).all()
-    ]
+    form.preferred_periods.choices = reference_data(current_user.id)['periods']
 
     if form.validate_on_submit():
         teacher.name = form.name.data.strip()
         teacher.week_hours = form.week_hours.data
-        teacher.preferred_days = ','.join(map(str, form.preferred_days.data)) or None
-        teacher.preferred_periods = ','.join(map(str, form.preferred_periods.data)) or None
+        teacher.preferred_days = form.preferred_days.data
+        teacher.preferred_periods = _user_periods(form.preferred_periods.data)
 
         db.session.commit()
         flash('Teacher updated successfully!', 'success')
         return redirect(url_for('teacher_list'))
 
     # Set initial selected values for periods and days after form submission check
-    if teacher.preferred_days:
-        form.preferred_days.data = list(map(int, teacher.preferred_days.split(',')))
-    if teacher.preferred_periods:
-        form.preferred_periods.data = list(map(int, teacher.preferred_periods.split(',')))
+    form.preferred_days.data = teacher.preferred_days
+    form.preferred_periods.data = [p.id for p in teacher.preferred_periods]
 
     return render_template('add_teacher.html', form=form, editing=True)
 
@@ -155,7 +255,8 @@ def edit_teacher(teacher_id):
 def delete_teacher(teacher_id):
     teacher = Teacher.query.filter_by(id=teacher_id, user_id=current_user.id).first_or_404()
     try:
-        TimetableEntry.query.filter_by(teacher_id=teacher_id, user_id=current_user.id).delete()
+        if TimetableEntry.query.filter_by(teacher_id=teacher_id, user_id=current_user.id).delete():
+            bump_entries_version(current_user.id)
 
         db.session.delete(teacher)
         db.session.commit()
@@ -170,7 +271,13 @@ def delete_teacher(teacher_id):
 @app.route('/subjects')
 @login_required
 def subject_list():
-    subjects = Subject.query.filter_by(user_id=current_user.id).order_by(Subject.name).all()
+    subjects = (
+        Subject.query
+        .filter_by(user_id=current_user.id)
+        .options(joinedload(Subject.default_room))
+        .order_by(Subject.name)
+        .all()
+    )
     return render_template('subject_list.html', subjects=subjects)
 
 @app.route('/add-subject', methods=['GET', 'POST'])
@@ -178,10 +285,7 @@ def subject_list():
 def add_subject():
     form = SubjectForm()
     # populate room choices as ints
-    form.default_room_id.choices = [(0, "No Room")] + [
-        (r.id, r.name)
-        for r in Room.query.filter_by(user_id=current_user.id)
-    ]
+    form.default_room_id.choices = [(0, "No Room")] + reference_data(current_user.id)['rooms']
 
     if form.validate_on_submit():
         name = form.name.data.strip()
@@ -212,10 +316,7 @@ def edit_subject(subject_id):
     subject = Subject.query.filter_by(id=subject_id, user_id=current_user.id).first_or_404()
     form = SubjectForm(obj=subject)
 
-    form.default_room_id.choices = [(0, "No Room")] + [
-        (r.id, r.name)
-        for r in Room.query.filter_by(user_id=current_user.id)
-    ]
+    form.default_room_id.choices = [(0, "No Room")] + reference_data(current_user.id)['rooms']
 
     if form.validate_on_submit():
         new_name = form.name.data.strip()
@@ -245,7 +346,8 @@ def delete_subject(subject_id):
     subject = Subject.query.filter_by(id=subject_id, user_id=current_user.id).first_or_404()
     try:
         # clean up any timetable entries first
-        TimetableEntry.query.filter_by(subject_id=subject_id, user_id=current_user.id).delete()
+        if TimetableEntry.query.filter_by(subject_id=subject_id, user_id=current_user.id).delete():
+            bump_entries_version(current_user.id)
         db.session.delete(subject)
         db.session.commit()
         flash('Subject deleted successfully.', 'success')
@@ -258,17 +360,12 @@ def delete_subject(subject_id):
 @app.route('/class-groups')
 @login_required
 def class_group_list():
-    groups = ClassGroup.query.filter_by(user_id=current_user.id).all()
-    periods = Period.query.filter_by(user_id=current_user.id).all()
-    periods_dict = {p.id: p for p in periods}
-
-    for group in groups:
-        if group.allowed_periods:
-            period_ids = map(int, group.allowed_periods.split(','))
-            group.periods_list = [periods_dict[pid] for pid in period_ids if pid in periods_dict]
-        else:
-            group.periods_list = []
-
+    groups = (
+        ClassGroup.query
+        .filter_by(user_id=current_user.id)
+        .options(joinedload(ClassGroup.default_room), selectinload(ClassGroup.allowed_periods))
+        .all()
+    )
     return render_template('class_group_list.html', groups=groups)
 
 
@@ -277,19 +374,17 @@ def class_group_list():
 def add_class_group():
     form = ClassGroupForm()
 
-    form.default_room_id.choices = [(0, "No Default Room")] + [(r.id, r.name) for r in Room.query.filter_by(user_id=current_user.id).all()]
-    
-    form.allowed_periods.choices = [
-        (p.id, f"{p.name} ({p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')})")
-        for p in Period.query.filter_by(user_id=current_user.id).all()
-    ]
+    refs = reference_data(current_user.id)
+    form.default_room_id.choices = [(0, "No Default Room")] + refs['rooms']
+    form.allowed_periods.choices = refs['periods']
 
     if form.validate_on_submit():
         group = ClassGroup(
             user_id=current_user.id,
             name=form.name.data.strip(),
             default_room_id=form.default_room_id.data if form.default_room_id.data != "0" else None,
-            allowed_periods=','.join(map(str, form.allowed_periods.data)) or None
+            is_junior=form.is_junior.data,
+            allowed_periods=_user_periods(form.allowed_periods.data)
         )
 
         db.session.add(group)
@@ -307,26 +402,22 @@ def edit_class_group(group_id):
     form  = ClassGroupForm(obj=group)
 
     # populate choices
-    form.default_room_id.choices = [(0, "No Room")] + [
-        (r.id, r.name) for r in Room.query.filter_by(user_id=current_user.id)
-    ]
-    form.allowed_periods.choices = [
-        (p.id, f"{p.name} ({p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')})")
-        for p in Period.query.filter_by(user_id=current_user.id)
-    ]
+    refs = reference_data(current_user.id)
+    form.default_room_id.choices = [(0, "No Room")] + refs['rooms']
+    form.allowed_periods.choices = refs['periods']
 
     if form.validate_on_submit():
         group.name            = form.name.data.strip()
         group.default_room_id = form.default_room_id.data if form.default_room_id.data != 0 else None
-        group.allowed_periods = ','.join(map(str, form.allowed_periods.data)) or None
+        group.is_junior       = form.is_junior.data
+        group.allowed_periods = _user_periods(form.allowed_periods.data)
 
         db.session.commit()
         flash('Class group updated successfully!', 'success')
         return redirect(url_for('class_group_list'))
 
     form.default_room_id.data = group.default_room_id if group.default_room_id else 0
-    if group.allowed_periods:
-        form.allowed_periods.data = list(map(int, group.allowed_periods.split(',')))
+    form.allowed_periods.data = [p.id for p in group.allowed_periods]
 
     return render_template('add_class_group.html', form=form, editing=True)
 
@@ -335,9 +426,9 @@ def edit_class_group(group_id):
 def delete_class_group(group_id):
     group = ClassGroup.query.filter_by(id=group_id, user_id=current_user.id).first_or_404()
     try:
-        TimetableEntry.query.filter_by(class_group_id=group_id, user_id=current_user.id).delete()
+        if TimetableEntry.query.filter_by(class_group_id=group_id, user_id=current_user.id).delete():
+            bump_entries_version(current_user.id)
         ScheduleAssignment.query.filter_by(class_group_id=group_id, user_id=current_user.id).delete()
-        group.allowed_periods = None
         db.session.delete(group)
         db.session.commit()
         flash('Class group deleted successfully.', 'success')
@@ -416,7 +507,8 @@ def delete_room(room_id):
     room = Room.query.filter_by(id=room_id, user_id=current_user.id).first_or_404()
     try:
         # Clean up references
-        TimetableEntry.query.filter_by(room_id=room_id, user_id=current_user.id).delete()
+        if TimetableEntry.query.filter_by(room_id=room_id, user_id=current_user.id).delete():
+            bump_entries_version(current_user.id)
         ClassGroup.query.filter_by(default_room_id=room_id, user_id=current_user.id)\
                   .update({"default_room_id": None})
         Subject.query.filter_by(default_room_id=room_id, user_id=current_user.id)\
@@ -489,7 +581,8 @@ def delete_period(period_id):
     period = Period.query.filter_by(id=period_id, user_id=current_user.id).first_or_404()
     try:
         # remove any timetable entries using this period
-        TimetableEntry.query.filter_by(period_id=period_id, user_id=current_user.id).delete()
+        if TimetableEntry.query.filter_by(period_id=period_id, user_id=current_user.id).delete():
+            bump_entries_version(current_user.id)
         db.session.delete(period)
         db.session.commit()
         flash('Period deleted successfully!', 'success')
@@ -503,7 +596,12 @@ def delete_period(period_id):
 @app.route('/schedule-assignments')
 @login_required
 def schedule_assignment_list():
-    assignments = ScheduleAssignment.query.filter_by(user_id=current_user.id).all()
+    assignments = (
+        ScheduleAssignment.query
+        .filter_by(user_id=current_user.id)
+        .options(*ASSIGNMENT_NAMES)
+        .all()
+    )
     return render_template('schedule_assignment_list.html', assignments=assignments)
 
 
@@ -513,22 +611,11 @@ def add_schedule_assignment():
     form = ScheduleAssignmentForm()
 
     # Populate dropdowns
-    form.class_group_id.choices = [
-        (cg.id, cg.name)
-        for cg in ClassGroup.query.filter_by(user_id=current_user.id)
-    ]
-    form.subject_id.choices = [
-        (s.id, s.name)
-        for s in Subject.query.filter_by(user_id=current_user.id)
-    ]
-    form.teacher_id.choices = [
-        (t.id, t.name)
-        for t in Teacher.query.filter_by(user_id=current_user.id)
-    ]
-    form.room_id.choices = [(0, "Default Room")] + [
-        (r.id, r.name)
-        for r in Room.query.filter_by(user_id=current_user.id)
-    ]
+    refs = reference_data(current_user.id)
+    form.class_group_id.choices = refs['class_groups']
+    form.subject_id.choices = refs['subjects']
+    form.teacher_id.choices = refs['teachers']
+    form.room_id.choices = [(0, "Default Room")] + refs['rooms']
 
     if form.validate_on_submit():
         assignment = ScheduleAssignment(
@@ -556,22 +643,11 @@ def edit_schedule_assignment(assignment_id):
     form = ScheduleAssignmentForm(obj=assignment)
 
     # Populate dropdowns
-    form.class_group_id.choices = [
-        (cg.id, cg.name)
-        for cg in ClassGroup.query.filter_by(user_id=current_user.id)
-    ]
-    form.subject_id.choices = [
-        (s.id, s.name)
-        for s in Subject.query.filter_by(user_id=current_user.id)
-    ]
-    form.teacher_id.choices = [
-        (t.id, t.name)
-        for t in Teacher.query.filter_by(user_id=current_user.id)
-    ]
-    form.room_id.choices = [(0, "Default Room")] + [
-        (r.id, r.name)
-        for r in Room.query.filter_by(user_id=current_user.id)
-    ]
+    refs = reference_data(current_user.id)
+    form.class_group_id.choices = refs['class_groups']
+    form.subject_id.choices = refs['subjects']
+    form.teacher_id.choices = refs['teachers']
+    form.room_id.choices = [(0, "Default Room")] + refs['rooms']
 
     if form.validate_on_submit():
         assignment.class_group_id = form.class_group_id.data
@@ -615,6 +691,7 @@ def timetable_list():
     entries = (
         TimetableEntry.query
         .filter_by(user_id=current_user.id)
+        .options(*ENTRY_NAMES, joinedload(TimetableEntry.period))
         .order_by(TimetableEntry.weekday, TimetableEntry.period_id)
         .all()
     )
@@ -627,27 +704,12 @@ def add_timetable_entry():
     form = TimetableEntryForm()
 
     # 1) populate dropdowns
-    form.class_group_id.choices = [
-        (c.id, c.name)
-        for c in ClassGroup.query.filter_by(user_id=current_user.id)
-    ]
-    form.subject_id.choices = [
-        (s.id, s.name)
-        for s in Subject.query.filter_by(user_id=current_user.id)
-    ]
-    form.teacher_id.choices = [(0, "No Specific Teacher")] + [
-        (t.id, t.name)
-        for t in Teacher.query.filter_by(user_id=current_user.id)
-    ]
-    form.room_id.choices = [(0, "Default Group Room")] + [
-        (r.id, r.name)
-        for r in Room.query.filter_by(user_id=current_user.id)
-    ]
-    form.period_id.choices = [
-        (p.id, f"{p.name} ({p.start_time.strftime('%H:%M')}–{p.end_time.strftime('%H:%M')})")
-        for p in Period.query.filter_by(user_id=current_user.id)
-                        .order_by(Period.start_time)
-    ]
+    refs = reference_data(current_user.id)
+    form.class_group_id.choices = refs['class_groups']
+    form.subject_id.choices = refs['subjects']
+    form.teacher_id.choices = [(0, "No Specific Teacher")] + refs['teachers']
+    form.room_id.choices = [(0, "Default Group Room")] + refs['rooms']
+    form.period_id.choices = refs['periods']
 
     if form.validate_on_submit():
         entry = TimetableEntry(
@@ -678,23 +740,12 @@ def edit_timetable_entry(entry_id):
     form = TimetableEntryForm(obj=entry)
 
     # 1) populate dropdowns
-    form.class_group_id.choices = [
-        (c.id, c.name) for c in ClassGroup.query.filter_by(user_id=current_user.id)
-    ]
-    form.subject_id.choices = [
-        (s.id, s.name) for s in Subject.query.filter_by(user_id=current_user.id)
-    ]
-    form.teacher_id.choices = [(0, "No Specific Teacher")] + [
-        (t.id, t.name) for t in Teacher.query.filter_by(user_id=current_user.id)
-    ]
-    form.room_id.choices = [(0, "Default Group Room")] + [
-        (r.id, r.name) for r in Room.query.filter_by(user_id=current_user.id)
-    ]
-    form.period_id.choices = [
-        (p.id, f"{p.name} ({p.start_time.strftime('%H:%M')}–{p.end_time.strftime('%H:%M')})")
-        for p in Period.query.filter_by(user_id=current_user.id)
-                        .order_by(Period.start_time)
-    ]
+    refs = reference_data(current_user.id)
+    form.class_group_id.choices = refs['class_groups']
+    form.subject_id.choices = refs['subjects']
+    form.teacher_id.choices = [(0, "No Specific Teacher")] + refs['teachers']
+    form.room_id.choices = [(0, "Default Group Room")] + refs['rooms']
+    form.period_id.choices = refs['periods']
 
     if form.validate_on_submit():
         entry.class_group_id = form.class_group_id.data
@@ -742,29 +793,72 @@ def delete_timetable_entry(entry_id):
 @app.route('/generate-schedule', methods=['POST'])
 @login_required
 def generate_schedule_route():
-    ok, sched = generate_schedule(current_user.id)
-    if not ok:
-        flash("Could not find a valid schedule. Try relaxing your constraints.", "danger")
-        return redirect(url_for('dashboard'))
+    # "incremental" keeps locked and still-valid entries and only re-solves
+    # the lessons around changed assignments
+    mode = 'incremental' if request.form.get('mode') == 'incremental' else 'full'
+    job = jobs.enqueue(current_user.id, mode)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(jobs.job_status(job)), 202
+
+    flash("Schedule generation started. The timetable will refresh when it is ready.", "success")
+    return redirect(url_for('dashboard'))
 
-    TimetableEntry.query.filter_by(user_id=current_user.id).delete()
 
-    for s in sched:
-        entry = TimetableEntry(
-            user_id=current_user.id,
-            class_group_id = s['group_id'],
-            subject_id     = s['subject_id'],
-            teacher_id     = s.get('teacher_id'),
-            room_id        = s.get('room_id'),
-            period_id      = s['period_id'],
-            weekday        = s['weekday'],
-            notes          = None,
-            is_locked      = False
-        )
-        db.session.add(entry)
+@app.route('/generate-schedule/<int:job_id>')
+@login_required
+def generation_job_status(job_id):
+    job = GenerationJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    jobs.resume_if_stalled(job)
+    return jsonify(jobs.job_status(job))
 
-    db.session.commit()
-    flash("Schedule generated successfully!", "success")
-    return redirect(url_for('dashboard'))
+
+@app.route('/generate-schedule/<int:job_id>/accept', methods=['POST'])
+@login_required
+def accept_generation_job(job_id):
+    # Stop optimising and save the best timetable found so far
+    job = GenerationJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    jobs.accept(job)
+    return jsonify(jobs.job_status(job))
+
+
+@app.route('/solver-settings', methods=['GET', 'POST'])
+@login_required
+def solver_settings():
+    settings = SolverSettings.for_user(current_user.id)
+    form = SolverSettingsForm(obj=settings)
+
+    if form.validate_on_submit():
+        settings.teacher_gaps        = form.teacher_gaps.data
+        settings.unpreferred_periods = form.unpreferred_periods.data
+        settings.subject_spread      = form.subject_spread.data
+        settings.junior_late         = form.junior_late.data
+        settings.junior_periods      = form.junior_periods.data
+        settings.soft_preferences    = form.soft_preferences.data
+        db.session.add(settings)
+        db.session.commit()
+        flash('Solver settings saved. They apply from the next generation.', 'success')
+        return redirect(url_for('solver_settings'))
+
+    return render_template('solver_settings.html', form=form)
 
 
+@app.route('/metrics')
+def metrics():
+    # Prometheus scrape target: generation run timings, solver statistics and
+    # the job queue of every tenant, without per-user labels. Off (404)
+    # until METRICS_TOKEN is set, then needs "Authorization: Bearer <token>".
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return Response(prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/profiling')
+@login_required
+def profiling_report():
+    # Per-endpoint timings of profiled requests; PROFILER_ADMINS only
+    if not is_admin(current_user):
+        abort(404)
+    return render_template('profiling.html', report=report())
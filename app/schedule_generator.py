@@ -1,41 +1,73 @@
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from ortools.sat.python import cp_model
-from datetime import datetime
-from app import db
+from sqlalchemy.orm import joinedload, selectinload
+from app import app, db
 from app.models import (
-    ScheduleAssignment, Teacher, ClassGroup, Room, Period
+    ScheduleAssignment, Teacher, ClassGroup, Room, Period, TimetableEntry, SolverSettings
 )
+from app.availability import DAYS, assignment_mask, occupancy, week_grid
+from app.decomposition import CombinedProgress, components
+from app.feasibility import Infeasible, counting_bounds
+from app.greedy import greedy
+from app.instrumentation import RunMetrics
+from app.objective import add_objective, penalty, weights_of
+from app.result_cache import fingerprint, get_cache
+from app.solver_profiles import get_profile, make_solver
+
+logger = logging.getLogger(__name__)
 
+# A component queued behind others still gets this long once it starts
+MIN_PART_SECONDS = 1
+# Large neighbourhood search (improve()): the neighbourhoods freed in turn,
+# and the time limit of each re-solve
+LNS_NEIGHBOURHOODS = ('day', 'teacher', 'group')
+LNS_STEP_SECONDS = 2
 
-def generate_schedule(user_id):
+
+def load_inputs(user_id):
     # 1) Load assignments and metadata
-    assigns = ScheduleAssignment.query.filter_by(user_id=user_id).all()
+    assigns = (
+        ScheduleAssignment.query
+        .filter_by(user_id=user_id)
+        .options(joinedload(ScheduleAssignment.class_group).selectinload(ClassGroup.allowed_periods))
+        .all()
+    )
     # Load teacher objects for preferences
-    teacher_objs = {t.id: t for t in Teacher.query.filter_by(user_id=user_id).all()}
+    teacher_objs = {
+        t.id: t for t in
+        Teacher.query.filter_by(user_id=user_id).options(selectinload(Teacher.preferred_periods))
+    }
 
     # Build teacher preference lookups (days 1-5, period IDs)
-    days = list(range(1, 6))
-    all_periods = Period.query.filter_by(user_id=user_id).all()
+    all_periods = Period.query.filter_by(user_id=user_id).order_by(Period.start_time).all()
     period_ids = [p.id for p in all_periods]
 
-    teacher_pref_days = {}
-    teacher_pref_periods = {}
+    # With soft preferences a teacher may teach any slot and the objective
+    # penalises the unpreferred ones instead
+    settings = SolverSettings.for_user(user_id)
+    teachers = {}
     for t_id, t in teacher_objs.items():
-        if t.preferred_days:
-            teacher_pref_days[t_id] = list(map(int, t.preferred_days.split(',')))
-        else:
-            teacher_pref_days[t_id] = days
-        if t.preferred_periods:
-            teacher_pref_periods[t_id] = list(map(int, t.preferred_periods.split(',')))
-        else:
-            teacher_pref_periods[t_id] = period_ids
+        preferred_days = t.preferred_days or None
+        preferred_periods = [p.id for p in t.preferred_periods] or None
+        teachers[t_id] = {
+            'week_hours': t.week_hours,
+            'days': DAYS if settings.soft_preferences else preferred_days or DAYS,
+            'periods': period_ids if settings.soft_preferences else preferred_periods or period_ids,
+            'preferred_days': preferred_days,
+            'preferred_periods': preferred_periods,
+        }
 
     # Build assignment dicts
     assignments = []
     for a in assigns:
-        if a.class_group.allowed_periods:
-            group_allowed = list(map(int, a.class_group.allowed_periods.split(',')))
-        else:
-            group_allowed = period_ids.copy()
+        group_allowed = [p.id for p in a.class_group.allowed_periods] or period_ids.copy()
         assignments.append({
             'id': a.id,
             'group': a.class_group_id,
@@ -43,92 +75,872 @@ def generate_schedule(user_id):
             'teacher': a.teacher_id,
             'hours': a.hours_per_week,
             'room': a.room_id or a.class_group.default_room_id,
-            'group_allowed': group_allowed
+            'group_allowed': group_allowed,
+            'junior': a.class_group.is_junior,
         })
 
-    # 2) Build CP-SAT model
-    model = cp_model.CpModel()
-    x = {}  # decision var x[(assignment_id, day, period)]
-
-    # Create variables with both class-group and teacher hard constraints
-    for a in assignments:
-        t_id = a['teacher']
-        # determine allowed days and periods per teacher preferences
-        if t_id and t_id in teacher_pref_days:
-            allowed_days = teacher_pref_days[t_id]
-        else:
-            allowed_days = days
-        if t_id and t_id in teacher_pref_periods:
-            allowed_periods = teacher_pref_periods[t_id]
+    return {
+        'days': DAYS,
+        'period_ids': period_ids,
+        'teachers': teachers,
+        'assignments': assignments,
+        'weights': weights_of(settings),
+        'junior_periods': settings.junior_periods,
+    }
+
+
+def load_entries(user_id):
+    return [{
+        'id': e.id,
+        'group': e.class_group_id,
+        'subject': e.subject_id,
+        'teacher': e.teacher_id,
+        'room': e.room_id,
+        'weekday': e.weekday,
+        'period': e.period_id,
+        'locked': bool(e.is_locked),
+    } for e in TimetableEntry.query.filter_by(user_id=user_id).all()]
+
+
+def assignment_domain(a, data):
+    return week_grid(data).slots(assignment_mask(a, data))
+
+
+def match_entries(data, entries):
+    # Pair existing timetable entries with the assignment they realise (same
+    # group, subject and teacher). Locked entries are paired first so they
+    # always count towards the hours; entries left over are orphans.
+    open_hours = {a['id']: a['hours'] for a in data['assignments']}
+    by_key = {}
+    for a in data['assignments']:
+        by_key.setdefault((a['group'], a['subject'], a['teacher']), []).append(a['id'])
+
+    matched = {a['id']: [] for a in data['assignments']}
+    orphans = []
+    for e in sorted(entries, key=lambda e: not e['locked']):
+        for aid in by_key.get((e['group'], e['subject'], e['teacher']), []):
+            if open_hours[aid] > 0:
+                open_hours[aid] -= 1
+                matched[aid].append(e)
+                break
         else:
-            allowed_periods = period_ids
-        # intersect with group_allowed
-        allowed_periods = [p for p in a['group_allowed'] if p in allowed_periods]
+            orphans.append(e)
+    return matched, orphans
+
+
+def changed_neighbourhood(data, matched, entries):
+    # Assignments whose current entries no longer satisfy them (hours edited,
+    # slot outside the domain, double booking, ...) plus every assignment that
+    # shares a group, teacher or room with one of them.
+    grid = week_grid(data)
+    seen = {'group': {}, 'teacher': {}, 'room': {}}
+    clashes = {'group': {}, 'teacher': {}, 'room': {}}
+    for e in entries:
+        bit = grid.bit(e['weekday'], e['period'])
+        for kind in seen:
+            key = e[kind]
+            if key is None:
+                continue
+            if seen[kind].get(key, 0) & bit:
+                clashes[kind][key] = clashes[kind].get(key, 0) | bit
+            seen[kind][key] = seen[kind].get(key, 0) | bit
+
+    changed = set()
+    for a in data['assignments']:
+        placed = matched[a['id']]
+        domain = assignment_mask(a, data)
+        days = [e['weekday'] for e in placed]
+        bits = [grid.bit(e['weekday'], e['period']) for e in placed]
+        if (len(placed) != a['hours'] or len(set(days)) != len(days)
+                or any(not e['locked'] and not bit & domain for e, bit in zip(placed, bits))
+                or any(bit & clashes[kind].get(e[kind], 0)
+                       for e, bit in zip(placed, bits)
+                       for kind in clashes if e[kind] is not None)):
+            changed.add(a['id'])
+
+    touched = {'group': set(), 'teacher': set(), 'room': set()}
+    for a in data['assignments']:
+        if a['id'] in changed:
+            touched['group'].add(a['group'])
+            touched['teacher'].add(a['teacher'])
+            touched['room'].add(a['room'])
+    touched['teacher'].discard(None)
+    touched['room'].discard(None)
+
+    return {
+        a['id'] for a in data['assignments']
+        if a['id'] in changed
+        or a['group'] in touched['group']
+        or a['teacher'] in touched['teacher']
+        or a['room'] in touched['room']
+    }
+
+
+def restrict(data, matched, orphans, free):
+    # Solver input for the `free` assignments only: everything else, plus all
+    # locked entries, becomes fixed occupancy the model must work around.
+    # Occupancy `data` already has (a restricted input) is kept.
+    fixed = [e for e in orphans if e['locked']]
+    for aid, placed in matched.items():
+        fixed.extend(e for e in placed if aid not in free or e['locked'])
+
+    blocked = occupancy(week_grid(data), fixed)
+    for kind, masks in (data.get('blocked') or {}).items():
+        for key, mask in masks.items():
+            blocked[kind][key] = blocked[kind].get(key, 0) | mask
+    teacher_load = {}
+    for e in fixed:
+        if e['teacher'] is not None:
+            teacher_load[e['teacher']] = teacher_load.get(e['teacher'], 0) + 1
+
+    assignments = []
+    for a in data['assignments']:
+        if a['id'] not in free:
+            continue
+        locked = [e for e in matched[a['id']] if e['locked']]
+        assignments.append(dict(
+            a,
+            hours=max(a['hours'] - len(locked), 0),
+            blocked_days=set(a.get('blocked_days') or ()) | {e['weekday'] for e in locked},
+        ))
 
-        for d in allowed_days:
-            for p in allowed_periods:
-                x[(a['id'], d, p)] = model.NewBoolVar(f"x_{a['id']}_{d}_{p}")
+    teachers = {
+        t_id: dict(t, week_hours=t['week_hours'] - teacher_load.get(t_id, 0))
+        for t_id, t in data['teachers'].items()
+    }
+    return dict(data, assignments=assignments, teachers=teachers, blocked=blocked), fixed
+
+
+def build_model(data, hints=None, assumptions=None, symmetry=True, redundant=True,
+                keep_hints=True):
+    # `hints` are x keys to start the search from; with keep_hints they are
+    # the current timetable and the objective rewards keeping them, without
+    # they are only a seed (app/greedy.py).
+    # With `assumptions` (a dict), coverage and the teacher caps are enforced
+    # through assumption literals, recorded as literal index -> requirement,
+    # so an infeasible model can name the requirements that clash.
+    # `symmetry` and `redundant` only prune or tighten the search (2.6, 2.7)
+    # and are skipped in that mode, where coverage may be switched off.
+    model = cp_model.CpModel()
+    # decision var x[(assignment_id, day, period)]; created before any other
+    # variable, which chosen() relies on
+    x = {}
+
+    # Variable indexes, filled once while the variables are created so that
+    # every constraint below is a single pass over its own bucket.
+    by_assignment = {}      # aid -> vars
+    by_assignment_day = {}  # (aid, day) -> vars
+    by_group_slot = {}      # (group, day, period) -> vars
+    by_teacher_slot = {}    # (teacher, day, period) -> vars
+    by_room_slot = {}       # (room, day, period) -> vars
+    by_teacher = {}         # teacher -> vars
+    domains = {}            # aid -> [(day, period)] in week order
+
+    for a in data['assignments']:
+        aid = a['id']
+        t_id = a['teacher'] if a['teacher'] in data['teachers'] else None
+        domains[aid] = assignment_domain(a, data)
+        for d, p in domains[aid]:
+            var = model.NewBoolVar(f"x_{aid}_{d}_{p}")
+            x[(aid, d, p)] = var
+            by_assignment.setdefault(aid, []).append(var)
+            by_assignment_day.setdefault((aid, d), []).append(var)
+            by_group_slot.setdefault((a['group'], d, p), []).append(var)
+            if t_id is not None:
+                by_teacher_slot.setdefault((t_id, d, p), []).append(var)
+                by_teacher.setdefault(t_id, []).append(var)
+            if a['room'] is not None:
+                by_room_slot.setdefault((a['room'], d, p), []).append(var)
+
+    literals = []
+
+    def assume(constraint, requirement):
+        if assumptions is not None:
+            literal = model.NewBoolVar(f"assume_{len(literals)}")
+            constraint.OnlyEnforceIf(literal)
+            literals.append(literal)
+            assumptions[literal.Index()] = requirement
 
     # 2.1 Coverage: each assignment appears exactly its required hours per week
-    for a in assignments:
-        vars_all = [x[(a['id'], d, p)]
-                    for (aid, d, p) in x if aid == a['id']]
-        model.Add(sum(vars_all) == a['hours'])
+    for a in data['assignments']:
+        assume(
+            model.Add(cp_model.LinearExpr.Sum(by_assignment.get(a['id'], [])) == a['hours']),
+            {'kind': 'assignment', 'group': a['group'], 'subject': a['subject'],
+             'teacher': a['teacher'], 'need': a['hours']},
+        )
 
     # 2.2 No same class more than once per day
-    for a in assignments:
-        for d in days:
-            vars_day = [x[(a['id'], d, p)] for p in period_ids if (a['id'], d, p) in x]
-            if vars_day:
-                model.Add(sum(vars_day) <= 1)
+    for vars_day in by_assignment_day.values():
+        if len(vars_day) > 1:
+            model.AddAtMostOne(vars_day)
 
     # 2.3 No double-booking: group, teacher, room per slot
-    for d in days:
-        for p in period_ids:
-            # class group
-            for g in set(a['group'] for a in assignments):
-                vars_g = [x[(a['id'], d, p)] for a in assignments if a['group']==g and (a['id'], d, p) in x]
-                if vars_g:
-                    model.Add(sum(vars_g) <= 1)
-            # teacher
-            for t_id in teacher_objs.keys():
-                vars_t = [x[(a['id'], d, p)] for a in assignments if a['teacher']==t_id and (a['id'], d, p) in x]
-                if vars_t:
-                    model.Add(sum(vars_t) <= 1)
-            # room
-            for r in set(a['room'] for a in assignments):
-                vars_r = [x[(a['id'], d, p)] for a in assignments if a['room']==r and (a['id'], d, p) in x]
-                if vars_r:
-                    model.Add(sum(vars_r) <= 1)
+    for index in (by_group_slot, by_teacher_slot, by_room_slot):
+        for vars_slot in index.values():
+            if len(vars_slot) > 1:
+                model.AddAtMostOne(vars_slot)
 
     # 2.4 Teacher max weekly hours
-    for t_id, teacher in teacher_objs.items():
-        vars_t = [x[(a['id'], d, p)]
-                  for a in assignments
-                  for (aid, d, p) in x if aid == a['id'] and a['teacher']==t_id]
-        if vars_t:
-            model.Add(sum(vars_t) <= teacher.week_hours)
-
-    # 3) Solve
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 10
-    status = solver.Solve(model)
+    for t_id, vars_t in by_teacher.items():
+        limit = data['teachers'][t_id]['week_hours']
+        assume(
+            model.Add(cp_model.LinearExpr.Sum(vars_t) <= limit),
+            {'kind': 'teacher_hours', 'teacher': t_id, 'available': limit},
+        )
+
+    if assumptions is None:
+        # 2.5 Soft constraints (app/objective.py); a core search only needs
+        # the hard ones
+        kept = hints if keep_hints else None
+        optimising = add_objective(model, x, data, kept)
+
+        # 2.6 Implied daily loads per teacher and group
+        if redundant:
+            _add_daily_loads(model, data, by_assignment_day,
+                             {'teacher': by_teacher_slot, 'group': by_group_slot},
+                             floors=not optimising)
+
+        # 2.7 Interchangeable assignments: search only one order of them.
+        # This pays off when the whole space must be searched to prove
+        # optimality; a feasibility search just gets slower to its first hit.
+        if symmetry and optimising:
+            for chain in _equivalent_assignments(data, domains, kept):
+                for first, second in zip(chain, chain[1:]):
+                    _order_first_lessons(model, x, domains[first], first, second)
+
+    # 2.8 Start the search from the current timetable
+    if hints is not None:
+        for key, var in x.items():
+            model.AddHint(var, 1 if key in hints else 0)
+
+    if literals:
+        model.AddAssumptions(literals)
+
+    return model, x
+
+
+def _add_daily_loads(model, data, by_assignment_day, by_owner_slot, floors=True):
+    # Cuts implied by coverage, once-per-day and no double booking, stated
+    # per (teacher or group, day) so the LP relaxation sees them: a day holds
+    # at most as many lessons as it has usable periods and assignments with
+    # a slot that day, and with `floors`, whatever the other days cannot hold
+    # must go here. Floors prove infeasibility much sooner but slow down
+    # optimality proofs (benchmarks/bench_symmetry.py), so they are only
+    # added to models without an objective.
+    assignments = {a['id']: a for a in data['assignments']}
+    for kind, by_slot in by_owner_slot.items():
+        totals = {}   # owner -> lessons a week
+        for a in data['assignments']:
+            totals[a[kind]] = totals.get(a[kind], 0) + a['hours']
+        spread = {}   # (owner, day) -> assignments
+        for aid, d in by_assignment_day:
+            key = (assignments[aid][kind], d)
+            spread[key] = spread.get(key, 0) + 1
+        days = {}     # owner -> day -> [vars, usable periods]
+        for (owner, d, p), vars_slot in by_slot.items():
+            day = days.setdefault(owner, {}).setdefault(d, [[], 0])
+            day[0].extend(vars_slot)
+            day[1] += 1
+
+        for owner, per_day in days.items():
+            caps = {d: min(periods, spread[(owner, d)]) for d, (_, periods) in per_day.items()}
+            week = sum(caps.values())
+            for d, (vars_day, _) in per_day.items():
+                load = cp_model.LinearExpr.Sum(vars_day)
+                model.Add(load <= min(caps[d], totals[owner]))
+                if floors and totals[owner] - (week - caps[d]) > 0:
+                    model.Add(load >= totals[owner] - (week - caps[d]))
+
+
+def _equivalent_assignments(data, domains, hints):
+    # Runs of assignments (sorted by id) that only differ by id: same
+    # group, subject, teacher, room, hours, locked days and domain, and no
+    # hinted lessons. Swapping two of them changes nothing, objective
+    # included, so their solutions come in interchangeable copies.
+    hinted = {aid for aid, _, _ in hints or ()}
+    runs = {}
+    for a in data['assignments']:
+        if a['hours'] <= 0 or a['id'] in hinted:
+            continue
+        key = (
+            a['group'], a['subject'], a['teacher'], a['room'], a['hours'],
+            frozenset(a.get('blocked_days') or ()), tuple(domains[a['id']]),
+        )
+        runs.setdefault(key, []).append(a['id'])
+    return [sorted(chain) for chain in runs.values() if len(chain) > 1]
+
+
+def _order_first_lessons(model, x, slots, first, second):
+    # Lexicographic order of two interchangeable assignments: `second` may
+    # only use a slot once `first` has a lesson in an earlier one. They share
+    # a group, so never a slot, and this keeps exactly one of each swapped pair.
+    seen = None  # `first` has a lesson before the current slot
+    for d, p in slots:
+        if seen is None:
+            model.Add(x[(second, d, p)] == 0)
+            seen = x[(first, d, p)]
+            continue
+        model.AddImplication(x[(second, d, p)], seen)
+        now = model.NewBoolVar(f"seen_{first}_{d}_{p}")
+        model.AddMaxEquality(now, [seen, x[(first, d, p)]])
+        seen = now
+
+
+def infeasible_core(data, profile=None):
+    # A 'core' problem listing requirements CP-SAT proved cannot all hold,
+    # or None if it could not prove that within the profile's time limit
+    requirements = {}
+    model, _ = build_model(data, assumptions=requirements)
+    # core extraction is only reported by a single-worker search
+    solver = make_solver(dict(get_profile(profile), workers=1))
+    if solver.Solve(model) != cp_model.INFEASIBLE:
+        return None
+    return {
+        'kind': 'core',
+        'parts': [requirements[i] for i in solver.SufficientAssumptionsForInfeasibility()],
+    }
+
+
+class ProgressCallback(cp_model.CpSolverSolutionCallback):
+    # Reports every improving solution as a plain dict to `on_progress`, and
+    # calls `on_first` once a solution exists
+    def __init__(self, on_progress=None, on_first=None):
+        super().__init__()
+        self.on_progress = on_progress
+        self.on_first = on_first
+        self.solutions = 0
+
+    def on_solution_callback(self):
+        self.solutions += 1
+        if self.solutions == 1 and self.on_first:
+            self.on_first()
+        if not self.on_progress:
+            return
+        self.on_progress({
+            'solutions': self.solutions,
+            'objective': self.ObjectiveValue(),
+            'bound': self.BestObjectiveBound(),
+            'wall_time': self.WallTime(),
+        })
+
+
+def solve_part(part, hints=None, profile=None, on_progress=None, on_solver=None, explain=False,
+               on_start=None, keep_hints=True, metrics=None):
+    # Placements {assignment id: {(day, period)}} for one solver input, or
+    # None if CP-SAT found none. on_solver gets the CpSolver once it has a
+    # solution, on_start as soon as it exists. Timings and solver statistics
+    # go to `metrics` (app/instrumentation.py).
+    metrics = metrics or RunMetrics()
+    with metrics.phase('build'):
+        model, x = build_model(part, hints, keep_hints=keep_hints)
+    solver = make_solver(profile)
+    if hints is not None and keep_hints:
+        # After an edit the old timetable is usually a few conflicts away from
+        # feasible; let CP-SAT repair it instead of dropping it on conflict.
+        # Not for a seed: symmetry breaking may rule it out, and repairing
+        # such a hint aborts CP-SAT 9.12 with several workers.
+        solver.parameters.repair_hint = True
+    if on_start:
+        on_start(solver)
+    with metrics.phase('solve'):
+        if on_progress or on_solver:
+            on_first = (lambda: on_solver(solver)) if on_solver else None
+            status = solver.Solve(model, ProgressCallback(on_progress, on_first))
+        else:
+            status = solver.Solve(model)
+    metrics.record_search(model, solver, status)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        if explain and status == cp_model.INFEASIBLE:
+            with metrics.phase('solve'):
+                core = infeasible_core(part, profile)
+            if core:
+                raise Infeasible([core])
+        return None
+
+    with metrics.phase('extract'):
+        placed = {}
+        for aid, d, p in chosen(solver, x):
+            placed.setdefault(aid, set()).add((d, p))
+    return placed
+
+
+def chosen(solver, x):
+    # The x keys set to 1 in the solver's solution. Read from the solution
+    # vector in one call rather than one Value() per variable: build_model
+    # creates the x variables first, so they are its first len(x) entries
+    # in x's order.
+    return itertools.compress(x, solver.ResponseProto().solution[:len(x)])
+
+
+def solve_parts(parts, hints=None, profile=None, on_progress=None, on_solver=None, explain=False,
+                keep_hints=True, metrics=None):
+    # Independent components (app/decomposition.py) solved side by side and
+    # merged. Threads rather than processes: CP-SAT releases the GIL while it
+    # searches, and every solver stays reachable for progress reports and
+    # StopSearch(). The profile's workers are shared out between the
+    # components, and each component starting gets its share of the time
+    # left, so queued ones are not starved when there are more components
+    # than workers. The first component without a solution stops the others.
+    profile = get_profile(profile)
+    budget = profile['workers'] or os.cpu_count() or 1
+    pool = min(len(parts), budget)
+    part_profile = dict(profile, workers=max(1, budget // pool))
+    deadline = time.monotonic() + profile['time_limit']
+    progress = CombinedProgress(on_progress) if on_progress else None
+    failed = threading.Event()
+    solvers = []
+    queued = [len(parts)]
+    lock = threading.Lock()
+
+    def run(index, part):
+        if failed.is_set():
+            return None
+        with lock:
+            share = min(1, pool / queued[0])
+            queued[0] -= 1
+        limit = max((deadline - time.monotonic()) * share, MIN_PART_SECONDS)
+        placed = solve_part(
+            part, hints, dict(part_profile, time_limit=limit),
+            progress.for_part(index) if progress else None, on_solver, explain, solvers.append,
+            keep_hints, metrics,
+        )
+        if placed is None:
+            failed.set()
+        return placed
+
+    with ThreadPoolExecutor(max_workers=pool) as executor:
+        futures = [executor.submit(run, i, part) for i, part in enumerate(parts)]
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if any(f.exception() for f in done):
+                failed.set()
+            if failed.is_set():
+                # repeated: StopSearch() is lost on a solver not yet searching
+                for solver in solvers:
+                    solver.StopSearch()
+
+    placed = {}
+    for future in futures:
+        result = future.result()  # re-raises Infeasible from a component
+        if result is None:
+            return None
+        placed.update(result)
+    return placed
+
+
+class _LnsStop:
+    # What improve() hands to on_solver: StopSearch() ends the loop and the
+    # re-solve in flight, like it ends a single CP-SAT search
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.solver = None
+
+    def StopSearch(self):
+        self.stopped.set()
+        if self.solver is not None:
+            self.solver.StopSearch()
+
+
+def improve(data, placed, seconds, profile=None, on_progress=None, on_solver=None,
+            on_iteration=None, metrics=None):
+    # Large neighbourhood search from the complete timetable `placed`
+    # {assignment id: {(day, period)}} of `data`: frees every lesson of one
+    # day, one teacher or one class group in turn, re-solves them with the
+    # rest of the timetable fixed and keeps the result unless the penalty
+    # (objective.penalty) got worse. Runs for `seconds` of wall time, until
+    # the penalty is 0 or until stopped through on_solver. Every iteration is
+    # logged and passed to on_iteration as a dict; the re-solves are
+    # recorded in `metrics` as LNS steps.
+    metrics = metrics or RunMetrics()
+    profile = get_profile(profile)
+    rng = random.Random(profile['seed'])
+    stop = _LnsStop()
+    if on_solver:
+        on_solver(stop)
+    started = time.monotonic()
+    assignments = {a['id']: a for a in data['assignments']}
+    owners = {
+        'day': list(data['days']),
+        'teacher': sorted({a['teacher'] for a in data['assignments'] if a['teacher'] is not None}),
+        'group': sorted({a['group'] for a in data['assignments']}),
+    }
+    # a school without teachers on its assignments has no teacher neighbourhood
+    kinds = [kind for kind in LNS_NEIGHBOURHOODS if owners[kind]]
+    placed = {aid: set(slots) for aid, slots in placed.items()}
+    current = penalty(data, placed)
+    improvements = 0
+
+    for iteration in itertools.count(1):
+        left = seconds - (time.monotonic() - started)
+        if stop.stopped.is_set() or left <= 0 or current == 0 or not assignments:
+            break
+        kind = kinds[(iteration - 1) % len(kinds)]
+        owner = rng.choice(owners[kind])
+        relaxed = {
+            (aid, d, p) for aid, slots in placed.items() for d, p in slots
+            if (d if kind == 'day' else assignments[aid][kind]) == owner
+        }
+        step_started = time.monotonic()
+        candidate = _resolve(
+            data, placed, relaxed, dict(profile, time_limit=min(LNS_STEP_SECONDS, left)), stop,
+            metrics,
+        )
+        score = None if candidate is None else penalty(data, candidate)
+        kept = score is not None and score <= current
+        step = {
+            'iteration': iteration,
+            'neighbourhood': kind,
+            'owner': owner,
+            'relaxed': len(relaxed),
+            'penalty_before': current,
+            'penalty': score,
+            'kept': kept,
+            'step_s': time.monotonic() - step_started,
+            'wall_time': time.monotonic() - started,
+        }
+        logger.info(
+            "LNS iteration %(iteration)d: %(neighbourhood)s %(owner)s, %(relaxed)d lessons freed, "
+            "penalty %(penalty_before)s -> %(penalty)s (%(kept)s) in %(step_s).2fs", step
+        )
+        if on_iteration:
+            on_iteration(step)
+        if not kept:
+            continue
+        placed = candidate
+        if score < current:
+            current = score
+            improvements += 1
+            if on_progress:
+                on_progress({
+                    'solutions': improvements + 1,
+                    'objective': current,
+                    'bound': None,
+                    'wall_time': step['wall_time'],
+                })
+    # the first timetable's objective and bound were for another model
+    metrics.set('objective', current)
+    metrics.set('bound', None)
+    return placed
+
+
+def _resolve(data, placed, relaxed, profile, stop, metrics):
+    # `placed` with the (aid, day, period) lessons in `relaxed` re-solved
+    # and everything else fixed, or None without a solution. The current
+    # slots are a complete, feasible hint, so CP-SAT never does worse than
+    # them given time to load it.
+    assignments = {a['id']: a for a in data['assignments']}
+    matched = {
+        aid: [{
+            'group': assignments[aid]['group'],
+            'teacher': assignments[aid]['teacher'],
+            'room': assignments[aid]['room'],
+            'weekday': d,
+            'period': p,
+            'locked': (aid, d, p) not in relaxed,
+        } for d, p in slots]
+        for aid, slots in placed.items()
+    }
+    with metrics.phase('availability'):
+        part, _ = restrict(data, matched, [], {aid for aid, _, _ in relaxed})
+    with metrics.phase('build'):
+        # symmetry breaking could cut off the hint
+        model, x = build_model(part, symmetry=False)
+        for key, var in x.items():
+            model.AddHint(var, 1 if key in relaxed else 0)
+
+    solver = make_solver(profile)
+    stop.solver = solver
+    if stop.stopped.is_set():
+        return None
+    with metrics.phase('solve'):
+        status = solver.Solve(model)
+    metrics.record_search(model, solver, status, main=False)
     if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        return False, []
-
-    # 4) Extract schedule
-    schedule = []
-    for (aid, d, p), var in x.items():
-        if solver.Value(var) == 1:
-            # find assignment a
-            a = next(a for a in assignments if a['id']==aid)
-            schedule.append({
-                'assignment_id': aid,
-                'group_id': a['group'],
-                'subject_id': a['subject'],
-                'teacher_id': a['teacher'],
-                'room_id': a['room'],
-                'period_id': p,
-                'weekday': d
-            })
-    return True, schedule
+        return None
+    with metrics.phase('extract'):
+        result = {
+            aid: {(d, p) for d, p in slots if (aid, d, p) not in relaxed}
+            for aid, slots in placed.items()
+        }
+        for aid, d, p in chosen(solver, x):
+            result[aid].add((d, p))
+    return result
+
+
+def current_placement(data, lessons):
+    # {aid: {(day, period)}} if the (aid, day, period) `lessons` already are
+    # a complete, clash-free timetable of `data`, else None
+    grid = week_grid(data)
+    placed = {a['id']: set() for a in data['assignments']}
+    for aid, d, p in lessons:
+        placed[aid].add((d, p))
+    busy = {'group': {}, 'teacher': {}, 'room': {}}
+    for a in data['assignments']:
+        slots = placed[a['id']]
+        if len(slots) != a['hours'] or len({d for d, _ in slots}) != len(slots):
+            return None
+        domain = assignment_mask(a, data)
+        for d, p in slots:
+            bit = grid.bit(d, p)
+            if not bit & domain:
+                return None
+            for kind in busy:
+                if a[kind] is None:
+                    continue
+                if busy[kind].get(a[kind], 0) & bit:
+                    return None
+                busy[kind][a[kind]] = busy[kind].get(a[kind], 0) | bit
+    return placed
+
+
+def solve(data, matched, orphans, free, hinted=False, on_progress=None, profile=None,
+          explain=False, on_solver=None, lns_lessons=0, metrics=None):
+    # Returns (ok, schedule, unplaced). Raises Infeasible when counting
+    # bounds (or, with `explain`, a CP-SAT core) show that no schedule
+    # exists, instead of waiting out the search. When CP-SAT finds nothing
+    # else, the schedule is the greedy one (app/greedy.py) and unplaced
+    # names the lessons it left out.
+    metrics = metrics or RunMetrics()
+    with metrics.phase('availability'):
+        sub, _ = restrict(data, matched, orphans, free)
+        problems = counting_bounds(sub)
+    if problems:
+        raise Infeasible(problems)
+    hints = None
+    if hinted:
+        # no current timetable yet (first run): search as without a hint
+        hints = {
+            (aid, e['weekday'], e['period'])
+            for aid in free for e in matched[aid] if not e['locked']
+        } or None
+    # 3) Solve, one model per independent component. With lns_lessons or
+    # more lessons to place and penalties to minimise, CP-SAT only looks for
+    # a first timetable (unless the current one or the greedy seed is
+    # complete) and improve() spends the rest of the time limit on the
+    # penalties. Searches without a current timetable to keep, and the
+    # first-timetable search, start from the greedy seed.
+    started = time.monotonic()
+    lns = bool(lns_lessons) and any((sub.get('weights') or {}).values()) and (
+        sum(a['hours'] for a in sub['assignments']) >= lns_lessons
+    )
+    keep_hints = hints is not None
+    with metrics.phase('availability'):
+        placed = current_placement(sub, hints) if lns and hints else None
+    seed = None
+    if placed is None and (lns or hints is None):
+        with metrics.phase('seed'):
+            seed = greedy(sub, hints or ())
+        if lns and not seed[1]:
+            placed = seed[0]
+        else:
+            hints = {(aid, d, p) for aid, slots in seed[0].items() for d, p in slots}
+            keep_hints = False
+    if placed is None:
+        first = dict(sub, weights=None) if lns else sub
+        with metrics.phase('availability'):
+            parts = components(first)
+        if len(parts) > 1:
+            placed = solve_parts(parts, hints, profile, on_progress, on_solver, explain,
+                                 keep_hints, metrics)
+        else:
+            placed = solve_part(first, hints, profile, on_progress, on_solver, explain,
+                                keep_hints=keep_hints, metrics=metrics)
+    unplaced = []
+    if placed is None:
+        # CP-SAT found nothing: the greedy timetable is better than none
+        if seed is None:
+            with metrics.phase('seed'):
+                seed = greedy(sub, hints)
+        placed, unplaced = seed
+    elif lns:
+        seconds = get_profile(profile)['time_limit'] - (time.monotonic() - started)
+        placed = improve(sub, placed, seconds, profile, on_progress, on_solver, metrics=metrics)
+
+    # 4) Extract schedule. Unlocked entries that stay put keep their row id;
+    # entries that move are reused before new rows are asked for.
+    with metrics.phase('extract'):
+        schedule = []
+        for a in data['assignments']:
+            if a['id'] not in free:
+                schedule.extend(
+                    dict(_item(a, e['weekday'], e['period'], e['id']), room_id=e['room'])
+                    for e in matched[a['id']] if not e['locked']
+                )
+        for a in sub['assignments']:
+            slots = placed.get(a['id'], set())
+            movable = []
+            for e in matched[a['id']]:
+                if e['locked']:
+                    continue
+                if (e['weekday'], e['period']) in slots:
+                    slots.discard((e['weekday'], e['period']))
+                    schedule.append(_item(a, e['weekday'], e['period'], e['id']))
+                else:
+                    movable.append(e['id'])
+            for d, p in sorted(slots):
+                schedule.append(_item(a, d, p, movable.pop() if movable else None))
+    return not unplaced, schedule, unplaced
+
+
+def _item(a, d, p, entry_id):
+    return {
+        'entry_id': entry_id,
+        'assignment_id': a['id'],
+        'group_id': a['group'],
+        'subject_id': a['subject'],
+        'teacher_id': a['teacher'],
+        'room_id': a['room'],
+        'period_id': p,
+        'weekday': d
+    }
+
+
+def preserved(entries, schedule):
+    # (kept, previous): unlocked lessons of the previous timetable that the
+    # schedule leaves in the same slot, out of all unlocked lessons
+    before = {
+        e['id']: (e['weekday'], e['period']) for e in entries if not e['locked']
+    }
+    kept = sum(
+        1 for s in schedule
+        if before.get(s['entry_id']) == (s['weekday'], s['period_id'])
+    )
+    return kept, len(before)
+
+
+def generate_schedule(user_id, on_progress=None, profile=None, incremental=False,
+                      warm_start=True, explain=False, on_solver=None, lns_lessons=0,
+                      metrics=None):
+    # Returns (ok, schedule, unplaced): the target placement of every
+    # unlocked lesson. Items with an entry_id update that row, items without
+    # one are new, and unlocked rows not mentioned are obsolete. Locked rows
+    # are never touched. If CP-SAT finds no timetable, the schedule is a
+    # greedy best effort, ok is False unless it is complete and unplaced
+    # lists the lessons left out as problem dicts (app/feasibility.py).
+    # With warm_start the current timetable is the solution hint, so a re-run
+    # after a small edit starts next to a feasible point and keeps most slots.
+    # Raises Infeasible with the violated requirements when they can be
+    # named; `explain` adds a CP-SAT core search after a proved infeasibility.
+    # on_solver gets every CpSolver once it has a solution (or the LNS loop,
+    # see improve()), so another thread can StopSearch() it and keep the best
+    # timetable found so far. Timetables of lns_lessons lessons or more are
+    # improved by large neighbourhood search; 0 never uses it.
+    # Complete results are cached by a fingerprint of the inputs
+    # (app/result_cache.py), both for the timetable they started from and for
+    # the one they leave behind, so pressing Generate again without changes
+    # returns at once. A best effort with lessons left out is not: the next
+    # run should search again rather than replay it.
+    # Phase timings, model size and solver statistics go to `metrics`
+    # (app/instrumentation.py).
+    metrics = metrics or RunMetrics()
+    with metrics.phase('load'):
+        data = load_inputs(user_id)
+        entries = load_entries(user_id)
+        matched, orphans = match_entries(data, entries)
+
+    cache = get_cache()
+    if cache:
+        with metrics.phase('cache'):
+            options = {
+                'incremental': incremental, 'warm_start': warm_start, 'explain': explain,
+                'lns_lessons': lns_lessons, 'profile': get_profile(profile),
+            }
+            key = fingerprint(data, entries, options)
+            cached = cache.get(key)
+        if cached is not None:
+            logger.info("Reusing cached schedule for user %s (%s)", user_id, cache.stats())
+            metrics.set('cached', True)
+            with metrics.phase('extract'):
+                schedule = _attach_entries(data, matched, cached['lessons'])
+            return cached['ok'], schedule, cached['unplaced']
+
+    stopped = threading.Event()
+    if on_solver:
+        # a search stopped early is not what these inputs would give, so
+        # its result is not cached
+        forward = on_solver
+        on_solver = lambda solver: forward(_Stoppable(solver, stopped))
+
+    ok, schedule, unplaced = _generate(
+        data, entries, matched, orphans, on_progress, profile, incremental, warm_start, explain,
+        on_solver, lns_lessons, metrics,
+    )
+    if cache and not stopped.is_set() and ok and not unplaced:
+        with metrics.phase('cache'):
+            value = {
+                'ok': ok,
+                'lessons': [[s['assignment_id'], s['weekday'], s['period_id'], s['room_id']] for s in schedule],
+                'unplaced': unplaced,
+            }
+            cache.put(key, value)
+            after = [e for e in entries if e['locked']] + [{
+                'group': s['group_id'], 'subject': s['subject_id'], 'teacher': s['teacher_id'],
+                'room': s['room_id'], 'weekday': s['weekday'], 'period': s['period_id'], 'locked': False,
+            } for s in schedule]
+            cache.put(fingerprint(data, after, options), value)
+    return ok, schedule, unplaced
+
+
+class _Stoppable:
+    # Stands in for a solver handed to on_solver and records StopSearch()
+    def __init__(self, solver, stopped):
+        self.solver = solver
+        self.stopped = stopped
+
+    def StopSearch(self):
+        self.stopped.set()
+        self.solver.StopSearch()
+
+
+def _attach_entries(data, matched, lessons):
+    # Schedule items for cached [aid, day, period, room] lessons: a lesson
+    # keeps the current unlocked entry in its slot, others reuse the rest of
+    # the assignment's unlocked entries before asking for new rows
+    assignments = {a['id']: a for a in data['assignments']}
+    rows = {aid: [e for e in placed if not e['locked']] for aid, placed in matched.items()}
+    schedule, moved = [], []
+    for aid, d, p, room in lessons:
+        entry = next((e for e in rows[aid] if (e['weekday'], e['period']) == (d, p)), None)
+        if entry is None:
+            moved.append((aid, d, p, room))
+            continue
+        rows[aid].remove(entry)
+        schedule.append(dict(_item(assignments[aid], d, p, entry['id']), room_id=room))
+    for aid, d, p, room in moved:
+        entry_id = rows[aid].pop()['id'] if rows[aid] else None
+        schedule.append(dict(_item(assignments[aid], d, p, entry_id), room_id=room))
+    return schedule
+
+
+def _generate(data, entries, matched, orphans, on_progress, profile, incremental, warm_start,
+              explain, on_solver, lns_lessons, metrics):
+    everything = {a['id'] for a in data['assignments']}
+
+    if incremental:
+        with metrics.phase('availability'):
+            free = changed_neighbourhood(data, matched, entries)
+        if free != everything:
+            # Only a few lessons move, so a good timetable comes within a
+            # fraction of a second; the weights would otherwise keep the
+            # search polishing it for the whole profile time limit
+            resolved = get_profile(profile)
+            quick = dict(resolved, time_limit=min(
+                resolved['time_limit'], app.config['SOLVER_INCREMENTAL_TIME_LIMIT'],
+            ))
+            try:
+                ok, schedule, unplaced = solve(
+                    data, matched, orphans, free, True, on_progress, quick,
+                    on_solver=on_solver, lns_lessons=lns_lessons, metrics=metrics,
+                )
+                if ok:
+                    return ok, schedule, unplaced
+            except Infeasible:
+                pass
+        # The neighbourhood cannot be repaired in place: free every unlocked
+        # lesson but keep steering the search towards the current timetable
+        return solve(data, matched, orphans, everything, True, on_progress, profile, explain,
+                     on_solver, lns_lessons, metrics)
+
+    return solve(data, matched, orphans, everything, warm_start, on_progress, profile, explain,
+                 on_solver, lns_lessons, metrics)
@@ -0,0 +1,57 @@
+import os
+
+from ortools.sat import sat_parameters_pb2
+from ortools.sat.python import cp_model
+
+from app import app
+
+# workers: 0 means every core on the host (CP-SAT portfolio search)
+# presolve: 0 = off, 1 = presolve without probing, 2 = full presolve
+# search: automatic, fixed, portfolio, lp, pseudo_cost, randomized
+SOLVER_PROFILES = {
+    'default': {'workers': 0, 'time_limit': 10, 'seed': 0, 'presolve': 2, 'search': 'automatic'},
+    'fast': {'workers': 0, 'time_limit': 3, 'seed': 0, 'presolve': 1, 'search': 'automatic'},
+    'thorough': {'workers': 0, 'time_limit': 60, 'seed': 0, 'presolve': 2, 'search': 'automatic'},
+    'single': {'workers': 1, 'time_limit': 10, 'seed': 0, 'presolve': 2, 'search': 'portfolio'},
+}
+
+SEARCH_BRANCHING = {
+    'automatic': 'AUTOMATIC_SEARCH',
+    'fixed': 'FIXED_SEARCH',
+    'portfolio': 'PORTFOLIO_SEARCH',
+    'lp': 'LP_SEARCH',
+    'pseudo_cost': 'PSEUDO_COST_SEARCH',
+    'randomized': 'RANDOMIZED_SEARCH',
+}
+
+
+def get_profile(profile=None):
+    # `profile` may be a profile name, a dict of overrides, or None for the
+    # app-wide SOLVER_PROFILE; unknown keys fall back to the default profile.
+    if profile is None:
+        profile = app.config['SOLVER_PROFILE']
+    if isinstance(profile, str):
+        if profile not in SOLVER_PROFILES:
+            raise ValueError(f"Unknown solver profile: {profile}")
+        profile = SOLVER_PROFILES[profile]
+    resolved = dict(SOLVER_PROFILES['default'])
+    resolved.update(profile)
+    if resolved['search'] not in SEARCH_BRANCHING:
+        raise ValueError(f"Unknown search strategy: {resolved['search']}")
+    return resolved
+
+
+def make_solver(profile=None):
+    profile = get_profile(profile)
+    solver = cp_model.CpSolver()
+    params = solver.parameters
+    params.max_time_in_seconds = profile['time_limit']
+    params.num_workers = profile['workers'] or os.cpu_count() or 1
+    params.random_seed = profile['seed']
+    params.cp_model_presolve = profile['presolve'] > 0
+    if profile['presolve'] == 1:
+        params.cp_model_probing_level = 0
+    params.search_branching = getattr(
+        sat_parameters_pb2.SatParameters, SEARCH_BRANCHING[profile['search']]
+    )
+    return solver
@@ -0,0 +1,224 @@
+import logging
+import time
+
+from sqlalchemy import delete, event, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session, joinedload
+
+from app import db
+from app.availability import DAYS, WeekGrid, clashes, occupancy, occupy
+from app.grid_cache import bump_timetable_version
+from app.models import Period, SolverSettings, TimetableEntry, User
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('class_group_id', 'subject_id', 'teacher_id', 'room_id', 'period_id', 'weekday')
+# Columns of the kinds two lessons in one slot may not share
+# (availability.occupancy), for narrowing queries to the lessons that matter
+CLASH_FIELDS = {'group': 'class_group_id', 'teacher': 'teacher_id', 'room': 'room_id'}
+
+
+class TimetableChanged(Exception):
+    # Raised by save_schedule when the timetable was edited after the
+    # generator read it, so its entry ids may no longer mean what they did
+    pass
+
+
+def entries_version(user_id):
+    # Bumped with every committed change to the user's timetable entries;
+    # renaming a teacher or room leaves it alone
+    return db.session.execute(select(User.entries_version).where(User.id == user_id)).scalar()
+
+
+def bump_entries_version(user_id):
+    # For entry writes that bypass the mapper events below (bulk statements,
+    # Query.delete()); runs in the caller's transaction
+    db.session.execute(
+        update(User).where(User.id == user_id)
+        .values(entries_version=User.entries_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@event.listens_for(TimetableEntry, 'after_insert')
+@event.listens_for(TimetableEntry, 'after_update')
+@event.listens_for(TimetableEntry, 'after_delete')
+def _entry_touched(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('entry_users', set()).add(target.user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_entries(session, flush_context):
+    # One UPDATE per flush, in the transaction of the change itself
+    users = session.info.pop('entry_users', None)
+    if users:
+        table = User.__table__
+        session.connection().execute(
+            update(table).where(table.c.id.in_(users))
+            .values(entries_version=table.c.entries_version + 1)
+        )
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_entries(session):
+    session.info.pop('entry_users', None)
+
+
+def save_schedule(user_id, sched, expected_version=None):
+    # Apply the generator's target placement with a fixed number of
+    # statements however large the timetable is: one SELECT of the current
+    # unlocked rows, then one executemany each for insert, update and delete.
+    # Runs inside the caller's transaction; locked rows are never touched.
+    # With `expected_version`, the user's entries_version from before the
+    # generator loaded its input is checked first, under a row lock, and
+    # nothing is written if a lock, move, edit or delete of an entry
+    # committed since.
+    start = time.perf_counter()
+    if expected_version is not None:
+        version = db.session.execute(
+            select(User.entries_version).where(User.id == user_id).with_for_update()
+        ).scalar()
+        if version != expected_version:
+            raise TimetableChanged(f"entries version {version}, expected {expected_version}")
+    existing = {
+        row.id: tuple(row[1:]) for row in db.session.execute(
+            select(TimetableEntry.id, *(getattr(TimetableEntry, f) for f in FIELDS))
+            .where(TimetableEntry.user_id == user_id, TimetableEntry.is_locked.isnot(True))
+        )
+    }
+
+    inserts, updates = [], []
+    for s in sched:
+        values = (
+            s['group_id'], s['subject_id'], s.get('teacher_id'),
+            s.get('room_id'), s['period_id'], s['weekday'],
+        )
+        current = existing.pop(s.get('entry_id'), None)
+        if current is None and s.get('entry_id') is not None:
+            # the row was locked or deleted meanwhile: never recreate it
+            continue
+        if current is None:
+            inserts.append(dict(zip(FIELDS, values), user_id=user_id, notes=None, is_locked=False))
+        elif current != values:
+            updates.append(dict(zip(FIELDS, values), id=s['entry_id']))
+
+    if inserts:
+        db.session.execute(insert(TimetableEntry), inserts)
+    if updates:
+        db.session.execute(update(TimetableEntry), updates)
+    if existing:
+        db.session.execute(
+            delete(TimetableEntry)
+            .where(TimetableEntry.id.in_(list(existing)))
+            .execution_options(synchronize_session=False)
+        )
+    if inserts or updates or existing:
+        # bulk statements skip the mapper events that keep these current
+        bump_timetable_version(user_id)
+        bump_entries_version(user_id)
+
+    logger.info(
+        "Saved schedule for user %s in %.3fs: %d inserted, %d moved, %d deleted",
+        user_id, time.perf_counter() - start, len(inserts), len(updates), len(existing),
+    )
+    return len(inserts), len(updates), len(existing)
+
+
+def move_conflicts(user_id, entries, targets):
+    # [(entry, other, kinds)] for moved `entries` whose target slot in
+    # `targets` ({entry id: (weekday, period_id)}) already holds a lesson
+    # sharing their group, teacher or room, or that collide with each other.
+    # The moves are checked together, so a swap is valid even though each
+    # half alone would clash. One query over the target cells, on the
+    # per-user slot index, however large the timetable is.
+    moving = {e.id for e in entries}
+    staying = (
+        TimetableEntry.query
+        .filter(
+            TimetableEntry.user_id == user_id,
+            tuple_(TimetableEntry.weekday, TimetableEntry.period_id).in_(set(targets.values())),
+            TimetableEntry.id.notin_(moving),
+        )
+        .options(
+            joinedload(TimetableEntry.class_group),
+            joinedload(TimetableEntry.subject),
+            joinedload(TimetableEntry.teacher),
+            joinedload(TimetableEntry.room),
+        )
+    )
+
+    grid = WeekGrid(DAYS, sorted({period_id for _, period_id in targets.values()}))
+    placed = [(other, _lesson(other, other.weekday, other.period_id)) for other in staying]
+    busy = occupancy(grid, [lesson for _, lesson in placed])
+
+    found = {}
+    for entry in entries:
+        moved = _lesson(entry, *targets[entry.id])
+        for kind in clashes(grid, busy, moved):
+            # name the lesson that took the slot first
+            other = next(
+                other for other, lesson in placed
+                if (lesson['weekday'], lesson['period']) == (moved['weekday'], moved['period'])
+                and lesson[kind] == moved[kind]
+            )
+            found.setdefault((entry, other), []).append(kind)
+        occupy(grid, busy, moved)
+        placed.append((entry, moved))
+    return [(entry, other, kinds) for (entry, other), kinds in found.items()]
+
+
+def _lesson(entry, weekday, period_id):
+    # `entry` in `weekday` / `period_id` as an availability.occupancy() dict
+    return {
+        'weekday': weekday, 'period': period_id, 'group': entry.class_group_id,
+        'teacher': entry.teacher_id, 'room': entry.room_id,
+    }
+
+
+def describe_conflicts(conflicts):
+    # JSON-ready form of move_conflicts() for the drag-and-drop endpoints
+    return [{
+        'moved_entry_id': entry.id,
+        'entry_id': other.id,
+        'kinds': kinds,
+        'group': other.class_group.name,
+        'subject': other.subject.name,
+        'teacher': other.teacher.name if other.teacher else None,
+        'room': other.room.name if other.room else None,
+    } for entry, other, kinds in conflicts]
+
+
+def free_slots(user_id, entry):
+    # (weekday, period_id) slots `entry` could be dropped on: inside its
+    # group's allowed periods (and its teacher's preferences unless those are
+    # soft), and not taken by another lesson of the same group, teacher or room
+    period_ids = [
+        p.id for p in Period.query.filter_by(user_id=user_id).order_by(Period.start_time)
+    ]
+    grid = WeekGrid(DAYS, period_ids)
+    mask = grid.mask(None, [p.id for p in entry.class_group.allowed_periods] or None)
+    if entry.teacher and not SolverSettings.for_user(user_id).soft_preferences:
+        mask &= grid.mask(
+            entry.teacher.preferred_days or None,
+            [p.id for p in entry.teacher.preferred_periods] or None,
+        )
+
+    shared = [
+        getattr(TimetableEntry, field) == getattr(entry, field)
+        for field in CLASH_FIELDS.values() if getattr(entry, field) is not None
+    ]
+    others = db.session.execute(
+        select(
+            TimetableEntry.weekday, TimetableEntry.period_id.label('period'),
+            TimetableEntry.class_group_id.label('group'), TimetableEntry.teacher_id.label('teacher'),
+            TimetableEntry.room_id.label('room'),
+        )
+        .where(TimetableEntry.user_id == user_id, TimetableEntry.id != entry.id, or_(*shared))
+    ).mappings()
+    busy = occupancy(grid, others)
+    lesson = _lesson(entry, None, None)
+    for kind in busy:
+        if lesson[kind] is not None:
+            mask &= ~busy[kind].get(lesson[kind], 0)
+    return grid.slots(mask)
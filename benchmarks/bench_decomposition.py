@@ -0,0 +1,93 @@
+"""Wall time of one CP-SAT model versus one model per independent component.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_decomposition
+    python -m benchmarks.bench_decomposition --campuses 1 2 4 --objective --workers 4
+
+Instances are synthetic.campuses: several schools sharing no class group,
+teacher or room, so app/decomposition.components splits them. "monolithic"
+solves the whole input as one model (schedule_generator.solve_part);
+"components" solves the parts side by side with the same worker budget and
+time limit (schedule_generator.solve_parts). With --objective the default
+penalty weights are minimised and the objective reached is shown as well;
+every penalty is local to a teacher or class group, so the components'
+objectives add up to the monolithic one.
+
+On a single core the parts run one after the other and the gain is only
+from the smaller models; with several workers they also run in parallel.
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.decomposition import components
+from app.models import SOLVER_DEFAULTS
+from app.objective import PENALTIES
+from app.schedule_generator import solve_part, solve_parts
+from benchmarks.synthetic import campuses
+
+
+def run(data, mode, profile, on_progress):
+    start = time.perf_counter()
+    if mode == 'monolithic':
+        placed = solve_part(data, profile=profile, on_progress=on_progress)
+    else:
+        placed = solve_parts(components(data), profile=profile, on_progress=on_progress)
+    return placed, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--campuses', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--groups', type=int, default=8, help="per campus")
+    parser.add_argument('--seeds', type=int, default=2)
+    parser.add_argument('--objective', action='store_true', help="minimise the default penalties")
+    parser.add_argument('--time-limit', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args(argv)
+
+    profile = {'workers': args.workers, 'time_limit': args.time_limit}
+    results = []
+    print(f"{'campuses':>8} {'seed':>4} {'parts':>5} {'lessons':>7}  {'monolithic':>20}  {'components':>20}")
+    for count in args.campuses:
+        for seed in range(args.seeds):
+            data = campuses(count, seed=seed * 100, groups=args.groups,
+                            teachers=args.groups * 3 // 2, rooms=args.groups + args.groups // 4)
+            if args.objective:
+                data['weights'] = {name: SOLVER_DEFAULTS[name] for name in PENALTIES}
+            cells = []
+            for mode in ('monolithic', 'components'):
+                best = {}
+                placed, elapsed = run(data, mode, profile, best.update)
+                row = {
+                    'campuses': count, 'seed': seed, 'mode': mode,
+                    'solved': placed is not None, 'wall_s': elapsed,
+                    'objective': best.get('objective') if args.objective else None,
+                }
+                results.append(row)
+                cell = f"{'ok' if row['solved'] else 'FAIL'} {elapsed:.2f}s"
+                if row['objective'] is not None:
+                    cell += f" {row['objective']:.0f}"
+                cells.append(cell)
+            lessons = sum(a['hours'] for a in data['assignments'])
+            print(f"{count:>8} {seed:>4} {len(components(data)):>5} {lessons:>7}  "
+                  + "  ".join(f"{c:>20}" for c in cells), flush=True)
+
+    print()
+    print(f"{'mode':<12} {'solved':>7} {'total s':>9}")
+    for mode in ('monolithic', 'components'):
+        rows = [r for r in results if r['mode'] == mode]
+        print(f"{mode:<12} {sum(r['solved'] for r in rows):>4}/{len(rows):<2} "
+              f"{sum(r['wall_s'] for r in rows):>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
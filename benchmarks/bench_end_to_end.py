@@ -0,0 +1,178 @@
+"""Generation end to end: load, model build, solve, write-back and dashboard render per school size.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_end_to_end
+    python -m benchmarks.bench_end_to_end --scales small medium large district \\
+        --tightness loose tight --time-limit 60 --json results.json
+    python -m benchmarks.bench_end_to_end --json new.json --compare results.json
+
+Every --scales x --tightness school (synthetic.school) is seeded into a
+throwaway SQLite database and generated once the way a job does it
+(app/jobs.run_job): generate_schedule with the per-phase metrics of
+app/instrumentation.py, then save_schedule. The dashboard is then rendered
+through the test client. The result and dashboard grid caches are off, so
+every row is a real solve and every render a real one. --json writes the rows together with the git revision, OR-Tools
+version, core count and solver profile, so runs on different commits can
+be compared; --compare prints each timing next to the one in an earlier
+file.
+"""
+import os
+import sys
+import tempfile
+
+_db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_file}'
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import subprocess  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+import ortools  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import app, db  # noqa: E402
+from app.instrumentation import PHASES, RunMetrics  # noqa: E402
+from app.schedule_generator import generate_schedule  # noqa: E402
+from app.solver_profiles import SOLVER_PROFILES, get_profile  # noqa: E402
+from app.timetable_store import save_schedule  # noqa: E402
+from benchmarks.seed import seed_school  # noqa: E402
+from benchmarks.synthetic import SCALES, TIGHTNESS, school  # noqa: E402
+
+# Row fields --compare reports, with the column heading
+COMPARED = (('build_s', 'build s'), ('solve_s', 'solve s'), ('save_s', 'save s'),
+            ('render_ms', 'render ms'), ('total_s', 'total s'))
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale, tightness, seed, profile, client, statements, repeat):
+    data = school(scale, tightness, seed)
+    with app.app_context():
+        start = time.perf_counter()
+        user_id = seed_school(f'{scale}-{tightness}-{seed}', data, entries=False).id
+        populate_s = time.perf_counter() - start
+
+        metrics = RunMetrics()
+        start = time.perf_counter()
+        ok, schedule, unplaced = generate_schedule(
+            user_id, profile=profile, metrics=metrics, lns_lessons=app.config['SOLVER_LNS_LESSONS'],
+        )
+        with metrics.phase('save'):
+            save_schedule(user_id, schedule)
+            db.session.commit()
+        total_s = time.perf_counter() - start
+
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    render_ms = None
+    for _ in range(repeat):
+        statements.clear()
+        start = time.perf_counter()
+        response = client.get('/dashboard')
+        elapsed = (time.perf_counter() - start) * 1000
+        render_ms = elapsed if render_ms is None else min(render_ms, elapsed)
+    if response.status_code != 200:
+        raise RuntimeError(f"/dashboard answered {response.status_code}")
+
+    values = metrics.values
+    return dict(
+        {'scale': scale, 'tightness': tightness, 'seed': seed,
+         'assignments': len(data['assignments']),
+         'lessons': sum(a['hours'] for a in data['assignments']),
+         'placed': len(schedule), 'unplaced': sum(u['need'] for u in unplaced), 'ok': ok,
+         'populate_s': populate_s, 'total_s': total_s},
+        **{f'{phase}_s': values.get(f'{phase}_s', 0) for phase in PHASES},
+        **{name: values.get(name) for name in (
+            'variables', 'constraints', 'searches', 'lns_steps', 'conflicts', 'branches',
+            'solver_status', 'objective', 'bound',
+        )},
+        render_ms=render_ms, render_queries=len(statements),
+    )
+
+
+def compare(rows, path):
+    with open(path) as fh:
+        baseline = json.load(fh)
+    before = {(r['scale'], r['tightness'], r['seed']): r for r in baseline['rows']}
+    print(f"\nagainst {path} (revision {baseline.get('revision')}), new / old:")
+    print(f"{'scale':>9} {'tightness':>9}  " + "  ".join(f"{heading:>17}" for _, heading in COMPARED))
+    for row in rows:
+        old = before.get((row['scale'], row['tightness'], row['seed']))
+        if old is None:
+            continue
+        cells = [f"{row[key]:.2f} / {old[key]:.2f}" for key, _ in COMPARED]
+        print(f"{row['scale']:>9} {row['tightness']:>9}  " + "  ".join(f"{c:>17}" for c in cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['small', 'medium', 'large'])
+    parser.add_argument('--tightness', nargs='+', choices=TIGHTNESS, default=['moderate'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--profile', choices=SOLVER_PROFILES, default='default')
+    parser.add_argument('--time-limit', type=float)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--repeat', type=int, default=3, help="dashboard renders, fastest kept")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="results file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    profile = get_profile(args.profile)
+    if args.time_limit is not None:
+        profile['time_limit'] = args.time_limit
+    if args.workers is not None:
+        profile['workers'] = args.workers
+    app.config['SOLVER_CACHE_SIZE'] = 0
+    app.config['DASHBOARD_CACHE_SIZE'] = 0
+
+    statements = []
+    with app.app_context():
+        db.create_all()
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, sql, *rest: statements.append(sql))
+    client = app.test_client()
+
+    rows = []
+    print(f"{'scale':>9} {'tightness':>9} {'lessons':>7} {'load s':>7} {'build s':>7} {'solve s':>7} "
+          f"{'save s':>7} {'render ms':>9} {'status':>10} {'penalty':>8} {'unplaced':>8}")
+    for scale in args.scales:
+        for tightness in args.tightness:
+            row = run(scale, tightness, args.seed, profile, client, statements, args.repeat)
+            rows.append(row)
+            penalty = '-' if row['objective'] is None else f"{row['objective']:g}"
+            print(f"{scale:>9} {tightness:>9} {row['lessons']:>7} {row['load_s']:>7.2f} "
+                  f"{row['build_s']:>7.2f} {row['solve_s']:>7.2f} {row['save_s']:>7.2f} "
+                  f"{row['render_ms']:>9.1f} {row['solver_status'] or '-':>10} {penalty:>8} "
+                  f"{row['unplaced']:>8}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({
+                'revision': revision(),
+                'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'ortools': ortools.__version__,
+                'cpus': os.cpu_count(),
+                'profile': profile,
+                'lns_lessons': app.config['SOLVER_LNS_LESSONS'],
+                'rows': rows,
+            }, fh, indent=2)
+    if args.compare:
+        compare(rows, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Reading a solution: one Value() per variable vs. the bulk solution vector.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_extraction
+    python -m benchmarks.bench_extraction --assignments 100 300 700 --workers 8
+
+Solves the feasibility model of synthetic schools of growing size
+(seeded with app/greedy.py so a solution comes quickly), then times
+reading the chosen lessons per variable and with
+schedule_generator.chosen. Exits non-zero if the two disagree, i.e. if
+the x variables stop being the model's first variables.
+"""
+import argparse
+import sys
+import time
+
+from ortools.sat.python import cp_model
+
+from app.greedy import greedy
+from app.schedule_generator import build_model, chosen
+from app.solver_profiles import make_solver
+from benchmarks.synthetic import scaled_inputs
+
+
+def per_variable(solver, x):
+    return [key for key, var in x.items() if solver.Value(var) == 1]
+
+
+def bulk(solver, x):
+    return list(chosen(solver, x))
+
+
+def best_of(read, solver, x, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        keys = read(solver, x)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, keys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assignments', type=int, nargs='+', default=[100, 300, 700])
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'assignments':>11} {'vars':>8} {'lessons':>7} {'Value() ms':>10} {'bulk ms':>8}")
+    for size in args.assignments:
+        data = scaled_inputs(size)
+        placed, _ = greedy(data)
+        seed = {(aid, d, p) for aid, slots in placed.items() for d, p in slots}
+        model, x = build_model(data, seed, keep_hints=False)
+        solver = make_solver({'workers': args.workers, 'time_limit': args.time_limit})
+        if solver.Solve(model) not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            print(f"{size:>11} {len(x):>8}  no solution, skipped")
+            continue
+        slow, expected = best_of(per_variable, solver, x, args.repeat)
+        fast, keys = best_of(bulk, solver, x, args.repeat)
+        print(f"{size:>11} {len(x):>8} {len(keys):>7} {slow * 1000:>10.2f} {fast * 1000:>8.2f}")
+        if keys != expected:
+            print("FAIL: bulk extraction disagrees with Value()")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Greedy seed: build time, lessons left out, and CP-SAT time to a first timetable.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_greedy
+    python -m benchmarks.bench_greedy --assignments 100 400 700 --time-limit 60 --workers 8
+
+For synthetic schools (synthetic.scaled_inputs) of growing size, times
+app/greedy.greedy and counts the lessons it could not place, then gives
+CP-SAT the feasibility model (no penalties) once cold and once with the
+greedy timetable as hint, as schedule_generator.solve does for searches
+without a current timetable. Instances rejected by the counting bounds of
+app/feasibility.py are reported and skipped.
+"""
+import argparse
+import sys
+import time
+
+from app.feasibility import counting_bounds
+from app.greedy import greedy
+from app.schedule_generator import solve_part
+from benchmarks.synthetic import scaled_inputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assignments', type=int, nargs='+', default=[100, 400, 700])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    profile = {'workers': args.workers, 'time_limit': args.time_limit}
+    print(f"{'assignments':>11} {'lessons':>7} {'greedy ms':>9} {'unplaced':>8} "
+          f"{'cold s':>8} {'seeded s':>8}")
+    for size in args.assignments:
+        data = scaled_inputs(size, seed=args.seed)
+        lessons = sum(a['hours'] for a in data['assignments'])
+        if counting_bounds(data):
+            print(f"{size:>11} {lessons:>7}  infeasible by counting bounds, skipped")
+            continue
+        start = time.perf_counter()
+        placed, unplaced = greedy(data)
+        greedy_ms = (time.perf_counter() - start) * 1000
+        hints = {(aid, d, p) for aid, slots in placed.items() for d, p in slots}
+
+        cells = []
+        for seed in (None, hints):
+            start = time.perf_counter()
+            found = solve_part(data, seed, profile, keep_hints=False)
+            elapsed = time.perf_counter() - start
+            cells.append(f"{elapsed:.1f}" if found is not None else "-")
+        print(f"{size:>11} {lessons:>7} {greedy_ms:>9.1f} {sum(u['need'] for u in unplaced):>8} "
+              f"{cells[0]:>8} {cells[1]:>8}", flush=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
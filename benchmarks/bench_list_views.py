@@ -0,0 +1,81 @@
+"""SQL statements and render time per list view.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_list_views
+    python -m benchmarks.bench_list_views --assignments 600 --max-queries 8
+
+Seeds one synthetic school into a throwaway SQLite database and renders
+every list view through the test client. Exits non-zero if any view issues
+more than --max-queries statements, i.e. if lazy loading creeps back into a
+template loop.
+"""
+import os
+import sys
+import tempfile
+
+_db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_file}'
+
+import argparse  # noqa: E402
+import time  # noqa: E402
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app, db  # noqa: E402
+from benchmarks.seed import seed_school  # noqa: E402
+from benchmarks.synthetic import scaled_inputs  # noqa: E402
+
+VIEWS = (
+    '/dashboard',
+    '/timetable',
+    '/schedule-assignments',
+    '/teachers',
+    '/class-groups',
+    '/subjects',
+    '/rooms',
+    '/periods',
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assignments', type=int, default=300)
+    parser.add_argument('--max-queries', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.create_all()
+        user = seed_school('bench', scaled_inputs(args.assignments, seed=args.seed, periods=8))
+        user_id = user.id
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, sql, *rest: statements.append(sql))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    failed = False
+    print(f"{'view':<22} {'status':>6} {'queries':>8} {'ms':>8}")
+    for view in VIEWS:
+        statements.clear()
+        start = time.perf_counter()
+        response = client.get(view)
+        elapsed = (time.perf_counter() - start) * 1000
+        over = len(statements) > args.max_queries
+        failed |= over or response.status_code != 200
+        print(f"{view:<22} {response.status_code:>6} {len(statements):>8} {elapsed:>8.1f}"
+              f"{'  FAIL' if over else ''}")
+
+    if failed:
+        print(f"FAIL: a view errored or issued more than {args.max_queries} statements")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Penalty reached by one CP-SAT model versus large neighbourhood search.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lns
+    python -m benchmarks.bench_lns --assignments 700 1000 --time-limit 120 --workers 4
+
+Instances are synthetic schools (synthetic.scaled_inputs) with the default
+penalty weights. "monolithic" gives the whole time limit to one model with
+the objective (schedule_generator.solve_part); "lns" spends it on a first
+timetable without the objective and then on schedule_generator.improve,
+which is what generate_schedule does from SOLVER_LNS_LESSONS lessons on.
+Both report the penalty of their final timetable (objective.penalty); the
+LNS per-iteration metrics can be written out with --json.
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.models import SOLVER_DEFAULTS
+from app.objective import PENALTIES, penalty
+from app.schedule_generator import improve, solve_part
+from benchmarks.synthetic import scaled_inputs
+
+
+def monolithic(data, profile):
+    return solve_part(data, profile=profile), []
+
+
+def lns(data, profile):
+    started = time.monotonic()
+    placed = solve_part(dict(data, weights=None), profile=profile)
+    if placed is None:
+        return None, []
+    iterations = []
+    seconds = profile['time_limit'] - (time.monotonic() - started)
+    return improve(data, placed, seconds, profile, on_iteration=iterations.append), iterations
+
+
+MODES = {'monolithic': monolithic, 'lns': lns}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assignments', type=int, nargs='+', default=[700])
+    parser.add_argument('--seeds', type=int, default=1)
+    parser.add_argument('--time-limit', type=float, default=60)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--json', help="write results and LNS iterations to this file")
+    args = parser.parse_args(argv)
+
+    profile = {'workers': args.workers, 'time_limit': args.time_limit}
+    results = []
+    print(f"{'assignments':>11} {'seed':>4} {'lessons':>7}  " + "  ".join(f"{m:>18}" for m in MODES))
+    for size in args.assignments:
+        for seed in range(args.seeds):
+            data = scaled_inputs(size, seed=seed)
+            data['weights'] = {name: SOLVER_DEFAULTS[name] for name in PENALTIES}
+            cells = []
+            for mode, run in MODES.items():
+                start = time.perf_counter()
+                placed, iterations = run(data, profile)
+                elapsed = time.perf_counter() - start
+                row = {
+                    'assignments': size, 'seed': seed, 'mode': mode, 'wall_s': elapsed,
+                    'penalty': None if placed is None else penalty(data, placed),
+                    'iterations': iterations,
+                }
+                results.append(row)
+                cells.append(f"{'FAIL' if placed is None else row['penalty']} {elapsed:.0f}s")
+            lessons = sum(a['hours'] for a in data['assignments'])
+            print(f"{size:>11} {seed:>4} {lessons:>7}  " + "  ".join(f"{c:>18}" for c in cells),
+                  flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""Model build time vs. model size.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_model_build
+
+Exits non-zero if the build cost per variable grows by more than
+--max-ratio between the smallest and the largest instance, i.e. if model
+construction stops being linear in the number of variables.
+"""
+import argparse
+import sys
+import time
+
+from app.schedule_generator import build_model
+from benchmarks.synthetic import scaled_inputs
+
+
+def time_build(data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model, x = build_model(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(x)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[75, 150, 300, 600, 1200])
+    parser.add_argument('--periods', type=int, default=9)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-ratio', type=float, default=2.5)
+    args = parser.parse_args(argv)
+
+    rows = []
+    print(f"{'assignments':>11} {'vars':>8} {'build s':>9} {'us/var':>8}")
+    for size in args.sizes:
+        data = scaled_inputs(size, periods=args.periods)
+        elapsed, n_vars = time_build(data, args.repeat)
+        per_var = elapsed / max(n_vars, 1) * 1e6
+        rows.append(per_var)
+        print(f"{len(data['assignments']):>11} {n_vars:>8} {elapsed:>9.3f} {per_var:>8.2f}")
+
+    ratio = rows[-1] / rows[0]
+    print(f"per-variable cost ratio largest/smallest: {ratio:.2f}")
+    if ratio > args.max_ratio:
+        print(f"FAIL: build time is not linear in variables (ratio > {args.max_ratio})")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
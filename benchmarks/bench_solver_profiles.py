@@ -0,0 +1,88 @@
+"""Time to first feasible and to optimal per solver profile.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_solver_profiles
+    python -m benchmarks.bench_solver_profiles --workers 1 2 4 8 --json out.json
+
+Every profile in app/solver_profiles.py is run on each synthetic dataset;
+--workers adds variants of the default profile pinned to those worker counts.
+"""
+import argparse
+import json
+import sys
+import time
+
+from ortools.sat.python import cp_model
+
+from app.schedule_generator import build_model
+from app.solver_profiles import SOLVER_PROFILES, get_profile, make_solver
+from benchmarks.synthetic import scaled_inputs
+
+DATASETS = {
+    'small': 80,
+    'medium': 300,
+    'large': 800,
+}
+
+
+class FirstSolution(cp_model.CpSolverSolutionCallback):
+    def __init__(self, start):
+        super().__init__()
+        self.start = start
+        self.first = None
+
+    def on_solution_callback(self):
+        if self.first is None:
+            self.first = time.perf_counter() - self.start
+
+
+def run(data, profile):
+    model, x = build_model(data)
+    solver = make_solver(profile)
+    start = time.perf_counter()
+    callback = FirstSolution(start)
+    status = solver.Solve(model, callback)
+    total = time.perf_counter() - start
+    return {
+        'status': solver.StatusName(status),
+        'first_feasible_s': callback.first,
+        'optimal_s': total if status == cp_model.OPTIMAL else None,
+        'wall_s': total,
+        'vars': len(x),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--profiles', nargs='+', default=list(SOLVER_PROFILES))
+    parser.add_argument('--workers', type=int, nargs='*', default=[])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args(argv)
+
+    profiles = {name: get_profile(name) for name in args.profiles}
+    for n in args.workers:
+        profiles[f'default-w{n}'] = get_profile({'workers': n})
+
+    results = []
+    print(f"{'dataset':<8} {'profile':<12} {'status':<10} {'first s':>8} {'optimal s':>10} {'wall s':>8}")
+    for ds in args.datasets:
+        data = scaled_inputs(DATASETS[ds], seed=args.seed, periods=8)
+        for name, profile in profiles.items():
+            row = run(data, profile)
+            row.update({'dataset': ds, 'profile': name, 'settings': profile})
+            results.append(row)
+            first = f"{row['first_feasible_s']:.3f}" if row['first_feasible_s'] is not None else '-'
+            optimal = f"{row['optimal_s']:.3f}" if row['optimal_s'] is not None else '-'
+            print(f"{ds:<8} {name:<12} {row['status']:<10} {first:>8} {optimal:>10} {row['wall_s']:>8.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Time to proof with and without symmetry breaking and implied daily loads.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_symmetry
+    python -m benchmarks.bench_symmetry --groups 6 8 10 12 --seeds 3 --time-limit 60
+
+Stress instances are synthetic schools whose short assignments are doubled
+into identical sections (synthetic.duplicate_sections). Instances that the
+counting bounds of app/feasibility.py already reject never reach CP-SAT and
+are skipped; of the rest some are still infeasible. With --objective they
+are solved with the default penalty weights, so the solver has to prove
+optimality. Each instance is solved with the model
+extras of schedule_generator.build_model switched off and on; a proof is
+OPTIMAL or INFEASIBLE within the time limit.
+
+build_model only breaks symmetry when there is an objective and only adds
+daily floors when there is none, so in the default mode the "symmetry"
+column matches "plain" and "both" matches "daily-loads"; --objective is
+where symmetry breaking shows.
+"""
+import argparse
+import json
+import sys
+import time
+
+from ortools.sat.python import cp_model
+
+from app.feasibility import counting_bounds
+from app.models import SOLVER_DEFAULTS
+from app.objective import PENALTIES
+from app.schedule_generator import build_model
+from app.solver_profiles import make_solver
+from benchmarks.synthetic import duplicate_sections, make_inputs
+
+CONFIGS = {
+    'plain': {'symmetry': False, 'redundant': False},
+    'symmetry': {'symmetry': True, 'redundant': False},
+    'daily-loads': {'symmetry': False, 'redundant': True},
+    'both': {'symmetry': True, 'redundant': True},
+}
+
+
+def stress_inputs(groups, periods, seed, objective):
+    data = duplicate_sections(make_inputs(
+        groups=groups, teachers=groups * 3 // 2, rooms=groups + groups // 4,
+        periods=periods, seed=seed,
+    ))
+    if objective:
+        data['weights'] = {name: SOLVER_DEFAULTS[name] for name in PENALTIES}
+    return data
+
+
+def run(data, config, profile):
+    model, _ = build_model(data, **config)
+    solver = make_solver(profile)
+    start = time.perf_counter()
+    status = solver.Solve(model)
+    elapsed = time.perf_counter() - start
+    found = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    return {
+        'status': solver.StatusName(status),
+        'proved': status in (cp_model.OPTIMAL, cp_model.INFEASIBLE),
+        'wall_s': elapsed,
+        # how far from proved the search stopped (objective runs only)
+        'objective': solver.ObjectiveValue() if found else None,
+        'bound': solver.BestObjectiveBound() if found else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', type=int, nargs='+', default=[6, 8, 10])
+    parser.add_argument('--periods', type=int, default=6)
+    parser.add_argument('--instances', type=int, default=3, help="per group count")
+    parser.add_argument('--objective', action='store_true', help="minimise the default penalties")
+    parser.add_argument('--time-limit', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=1, help="1 keeps timings reproducible")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args(argv)
+
+    profile = {'workers': args.workers, 'time_limit': args.time_limit}
+    results = []
+    print(f"{'groups':>6} {'seed':>4} {'lessons':>7}  " + "  ".join(f"{name:>24}" for name in CONFIGS))
+    for groups in args.groups:
+        seed, kept = -1, 0
+        while kept < args.instances:
+            seed += 1
+            data = stress_inputs(groups, args.periods, seed, args.objective)
+            if counting_bounds(data):
+                continue
+            kept += 1
+            cells = []
+            for name, config in CONFIGS.items():
+                row = run(data, config, profile)
+                row.update({'groups': groups, 'seed': seed, 'config': name})
+                results.append(row)
+                cell = f"{row['status'][:8]} {row['wall_s']:.1f}s"
+                if args.objective and row['objective'] is not None:
+                    cell += f" {row['objective']:.0f}/{row['bound']:.0f}"
+                cells.append(cell)
+            lessons = sum(a['hours'] for a in data['assignments'])
+            print(f"{groups:>6} {seed:>4} {lessons:>7}  " + "  ".join(f"{c:>24}" for c in cells), flush=True)
+
+    print()
+    print(f"{'config':<12} {'proofs':>7} {'total s':>9}")
+    for name in CONFIGS:
+        rows = [r for r in results if r['config'] == name]
+        print(f"{name:<12} {sum(r['proved'] for r in rows):>4}/{len(rows):<2} "
+              f"{sum(r['wall_s'] for r in rows):>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""List-view latency across many tenants with and without per-user indexes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_tenant_indexes
+    python -m benchmarks.bench_tenant_indexes --tenants 500 --assignments 40 --sample 25
+
+Seeds --tenants synthetic schools into one throwaway SQLite database, then
+renders every list view for a sample of tenants twice: once with the
+secondary indexes declared on the models dropped, once with them in place.
+Unique constraints stay in both runs, since SQLite cannot drop them in place.
+"""
+import os
+import sys
+import tempfile
+
+_db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_file}'
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import statistics  # noqa: E402
+import time  # noqa: E402
+
+from app import app, db  # noqa: E402
+from benchmarks.bench_list_views import VIEWS  # noqa: E402
+from benchmarks.seed import seed_school  # noqa: E402
+from benchmarks.synthetic import scaled_inputs  # noqa: E402
+
+
+def indexes():
+    return [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+
+def measure(client, user_ids):
+    timings = {view: [] for view in VIEWS}
+    for user_id in user_ids:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        for view in VIEWS:
+            start = time.perf_counter()
+            client.get(view)
+            timings[view].append((time.perf_counter() - start) * 1000)
+    return {view: statistics.median(ms) for view, ms in timings.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=500)
+    parser.add_argument('--assignments', type=int, default=40)
+    parser.add_argument('--sample', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        user_ids = [
+            seed_school(f'tenant{i}', scaled_inputs(args.assignments, seed=args.seed + i, periods=8)).id
+            for i in range(args.tenants)
+        ]
+        print(f"seeded {args.tenants} tenants in {time.perf_counter() - start:.1f}s")
+
+    sample = random.Random(args.seed).sample(user_ids, min(args.sample, len(user_ids)))
+    client = app.test_client()
+
+    with app.app_context():
+        for index in indexes():
+            index.drop(db.engine)
+    before = measure(client, sample)
+
+    with app.app_context():
+        for index in indexes():
+            index.create(db.engine)
+    after = measure(client, sample)
+
+    print(f"{'view':<22} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for view in VIEWS:
+        print(f"{view:<22} {before[view]:>10.2f} {after[view]:>10.2f} {before[view] / after[view]:>7.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
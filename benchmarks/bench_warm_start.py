@@ -0,0 +1,108 @@
+"""Cold vs. warm (hinted) solve after a small edit to the inputs.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_warm_start
+    python -m benchmarks.bench_warm_start --edits 1 5 20 --profile single
+
+Each synthetic dataset is solved once to get a "previous" timetable. The
+inputs are then perturbed (teacher loses a day, assignment gains or loses an
+hour, group loses a period) and re-solved from scratch and with the previous
+timetable as solution hint. Reports time to feasibility and how many of the
+previous lessons keep their slot.
+"""
+import argparse
+import random
+import sys
+import time
+
+from app.schedule_generator import match_entries, preserved, solve
+from benchmarks.synthetic import scaled_inputs
+
+DATASETS = {
+    'small': 80,
+    'medium': 300,
+    'large': 800,
+}
+
+
+def as_entries(schedule):
+    return [{
+        'id': i,
+        'group': s['group_id'],
+        'subject': s['subject_id'],
+        'teacher': s['teacher_id'],
+        'room': s['room_id'],
+        'weekday': s['weekday'],
+        'period': s['period_id'],
+        'locked': False,
+    } for i, s in enumerate(schedule, start=1)]
+
+
+def perturb(data, edits, rng):
+    # Copy of `data` with `edits` small changes of the kind users make
+    # between two runs
+    data = dict(
+        data,
+        teachers={t_id: dict(t) for t_id, t in data['teachers'].items()},
+        assignments=[dict(a) for a in data['assignments']],
+    )
+    for _ in range(edits):
+        kind = rng.choice(('teacher_day', 'hours', 'group_period'))
+        a = rng.choice(data['assignments'])
+        if kind == 'teacher_day':
+            teacher = data['teachers'][a['teacher']]
+            busiest = max(o['hours'] for o in data['assignments'] if o['teacher'] == a['teacher'])
+            if len(teacher['days']) > max(3, busiest):
+                dropped = rng.choice(teacher['days'])
+                teacher['days'] = [d for d in teacher['days'] if d != dropped]
+        elif kind == 'hours':
+            a['hours'] = max(1, min(len(data['days']), a['hours'] + rng.choice((-1, 1))))
+            data['teachers'][a['teacher']]['week_hours'] += 1
+        elif len(a['group_allowed']) > len(data['days']):
+            dropped = rng.choice(a['group_allowed'])
+            for other in data['assignments']:
+                if other['group'] == a['group']:
+                    other['group_allowed'] = [p for p in other['group_allowed'] if p != dropped]
+    return data
+
+
+def run(data, entries, hinted, profile):
+    matched, orphans = match_entries(data, entries)
+    everything = {a['id'] for a in data['assignments']}
+    start = time.perf_counter()
+    ok, schedule, _ = solve(data, matched, orphans, everything, hinted, profile=profile)
+    elapsed = time.perf_counter() - start
+    kept, previous = preserved(entries, schedule) if ok else (0, len(entries))
+    return ok, elapsed, kept, previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--edits', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--profile', default='default')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(f"{'dataset':<8} {'edits':>5} {'mode':<5} {'ok':<3} {'solve s':>8} {'kept':>12}")
+    for ds in args.datasets:
+        data = scaled_inputs(DATASETS[ds], seed=args.seed, periods=8)
+        # The previous timetable gets the long profile so larger datasets have one
+        ok, previous, _ = solve(data, {a['id']: [] for a in data['assignments']}, [],
+                             {a['id'] for a in data['assignments']}, profile='thorough')
+        if not ok:
+            print(f"{ds:<8} base dataset is infeasible, skipped")
+            continue
+        entries = as_entries(previous)
+        for edits in args.edits:
+            edited = perturb(data, edits, random.Random(args.seed + edits))
+            for mode, hinted in (('cold', False), ('warm', True)):
+                ok, elapsed, kept, total = run(edited, entries, hinted, args.profile)
+                print(f"{ds:<8} {edits:>5} {mode:<5} {'y' if ok else 'n':<3} {elapsed:>8.3f} "
+                      f"{f'{kept}/{total}':>12}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
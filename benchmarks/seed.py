@@ -0,0 +1,113 @@
+"""Seed a synthetic school into the configured database as a new user.
+
+Run from the repository root, after `flask db upgrade`:
+
+    python -m benchmarks.seed demo
+    python -m benchmarks.seed district --scale district --tightness tight
+
+Creates the periods, rooms, subjects, teachers, class groups and schedule
+assignments of synthetic.school for user USERNAME, whose password is the
+username. --entries also places every lesson (not a valid timetable).
+"""
+import argparse
+import sys
+from datetime import time
+
+from werkzeug.security import generate_password_hash
+
+from app import app, db
+from app.models import (
+    ClassGroup, Period, Room, ScheduleAssignment, Subject, Teacher, TimetableEntry, User
+)
+from benchmarks.synthetic import SCALES, TIGHTNESS, school
+
+
+def seed_school(username, data, entries=True):
+    # Store a synthetic school (see synthetic.make_inputs) as a new user's rows
+    # and return the user. With `entries`, every assignment also gets its
+    # lessons on consecutive days in a fixed period: enough rows for the list
+    # views, not a valid timetable. Must run inside an app context.
+    user = User(username=username, hashed_password=generate_password_hash(username))
+    db.session.add(user)
+    db.session.flush()
+
+    periods = {
+        p: Period(user_id=user.id, name=f"Period {p}",
+                  start_time=time(7 + i % 12, 0), end_time=time(7 + i % 12, 45))
+        for i, p in enumerate(data['period_ids'])
+    }
+    rooms = {
+        r: Room(user_id=user.id, name=f"Room {r}")
+        for r in {a['room'] for a in data['assignments'] if a['room'] is not None}
+    }
+    subjects = {
+        s: Subject(user_id=user.id, name=f"Subject {s}", default_hours_per_week=2)
+        for s in {a['subject'] for a in data['assignments']}
+    }
+    db.session.add_all([*periods.values(), *rooms.values(), *subjects.values()])
+    db.session.flush()
+
+    teachers = {}
+    for t_id, t in data['teachers'].items():
+        teachers[t_id] = Teacher(
+            user_id=user.id, name=f"Teacher {t_id}", week_hours=t['week_hours'],
+            preferred_days=t['days'] if t['days'] != data['days'] else None,
+            preferred_periods=(
+                [periods[p] for p in t['periods']] if t['periods'] != data['period_ids'] else []
+            ),
+        )
+    groups = {
+        g: ClassGroup(user_id=user.id, name=f"Group {g}")
+        for g in {a['group'] for a in data['assignments']}
+    }
+    db.session.add_all([*teachers.values(), *groups.values()])
+    db.session.flush()
+
+    for a in data['assignments']:
+        db.session.add(ScheduleAssignment(
+            user_id=user.id,
+            class_group_id=groups[a['group']].id,
+            subject_id=subjects[a['subject']].id,
+            teacher_id=teachers[a['teacher']].id,
+            hours_per_week=a['hours'],
+            room_id=rooms[a['room']].id if a['room'] is not None else None,
+        ))
+        if not entries:
+            continue
+        period = periods[data['period_ids'][a['id'] % len(data['period_ids'])]]
+        for day in data['days'][:a['hours']]:
+            db.session.add(TimetableEntry(
+                user_id=user.id,
+                class_group_id=groups[a['group']].id,
+                subject_id=subjects[a['subject']].id,
+                teacher_id=teachers[a['teacher']].id,
+                room_id=rooms[a['room']].id if a['room'] is not None else None,
+                period_id=period.id,
+                weekday=day,
+            ))
+    db.session.commit()
+    return user
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('username')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--tightness', choices=TIGHTNESS, default='moderate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--entries', action='store_true', help="also place every lesson")
+    args = parser.parse_args(argv)
+
+    data = school(args.scale, args.tightness, args.seed)
+    with app.app_context():
+        if User.query.filter_by(username=args.username).first():
+            print(f"User {args.username} already exists")
+            return 1
+        seed_school(args.username, data, entries=args.entries)
+    print(f"Seeded {args.username}: {len(data['assignments'])} assignments, "
+          f"{sum(a['hours'] for a in data['assignments'])} lessons a week")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
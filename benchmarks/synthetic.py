@@ -0,0 +1,159 @@
+import random
+
+from app.schedule_generator import DAYS
+
+
+# Named sizes for seeding and the end-to-end benchmark, from one small school
+# to a district of four (about 100, 450, 1,100 and 3,000 lessons)
+SCALES = {
+    'small': {'groups': 5},
+    'medium': {'groups': 20},
+    'large': {'groups': 50},
+    'district': {'groups': 35, 'campuses': 4},
+}
+# Share of teachers with restricted days and, separately, restricted periods
+TIGHTNESS = {'loose': 0.1, 'moderate': 0.3, 'tight': 0.6}
+
+
+def make_inputs(groups=20, teachers=30, rooms=25, periods=7,
+                subjects_per_group=8, pref_ratio=0.3, seed=0):
+    # Solver input dict in the shape produced by schedule_generator.load_inputs,
+    # without touching the database.
+    rng = random.Random(seed)
+    period_ids = list(range(1, periods + 1))
+    room_ids = list(range(1, rooms + 1))
+    # Every group gets a home room of its own while rooms last; the rest are
+    # shared specialist rooms
+    home_rooms = room_ids[:groups]
+    shared_rooms = room_ids[groups:] or room_ids
+
+    teacher_data = {}
+    for t_id in range(1, teachers + 1):
+        days = DAYS
+        t_periods = period_ids
+        if rng.random() < pref_ratio:
+            days = sorted(rng.sample(DAYS, rng.randint(3, 5)))
+        if rng.random() < pref_ratio:
+            t_periods = sorted(rng.sample(period_ids, max(1, periods - rng.randint(0, 2))))
+        teacher_data[t_id] = {'week_hours': 0, 'days': days, 'periods': t_periods}
+
+    assignments = []
+    aid = 1
+    weekly_capacity = len(DAYS) * periods
+    room_load = {}
+    for g in range(1, groups + 1):
+        default_room = home_rooms[(g - 1) % len(home_rooms)]
+        budget = int(weekly_capacity * 0.75)
+        for s in range(1, subjects_per_group + 1):
+            hours = min(rng.randint(1, 5), budget)
+            if hours <= 0:
+                break
+            t_id = _pick_teacher(teacher_data, hours, rng)
+            if t_id is None:
+                continue
+            budget -= hours
+            teacher_data[t_id]['week_hours'] += hours
+            room = default_room
+            if rng.random() < 0.2:
+                # a shared room stays below the same 75% as a group's week
+                shared = rng.choice(shared_rooms)
+                if room_load.get(shared, 0) + hours <= weekly_capacity * 3 // 4:
+                    room = shared
+            room_load[room] = room_load.get(room, 0) + hours
+            assignments.append({
+                'id': aid,
+                'group': g,
+                'subject': s,
+                'teacher': t_id,
+                'hours': hours,
+                'room': room,
+                'group_allowed': period_ids.copy(),
+            })
+            aid += 1
+
+    return {
+        'days': DAYS,
+        'period_ids': period_ids,
+        'teachers': teacher_data,
+        'assignments': assignments,
+    }
+
+
+def _pick_teacher(teacher_data, hours, rng, tries=20):
+    # A teacher who can still take `hours` more lessons: at most one per
+    # preferred day, and no more than half of their preferred slots in total
+    # so the instance stays comfortably feasible
+    for _ in range(tries):
+        t_id = rng.choice(list(teacher_data))
+        t = teacher_data[t_id]
+        if hours <= len(t['days']) and t['week_hours'] + hours <= len(t['days']) * len(t['periods']) // 2:
+            return t_id
+    return None
+
+
+def scaled_inputs(assignments, seed=0, **kwargs):
+    # Roughly `assignments` assignments with entity counts growing in step
+    groups = max(1, assignments // 8)
+    return make_inputs(
+        groups=groups,
+        teachers=max(1, groups * 3 // 2),
+        rooms=max(1, groups + groups // 4),
+        seed=seed,
+        **kwargs
+    )
+
+
+def duplicate_sections(data, copies=2, max_hours=2):
+    # Stress variant of a solver input: every assignment of at most
+    # `max_hours` hours gets `copies` - 1 identical twins (parallel sections
+    # taught by the same teacher), i.e. interchangeable assignments. Teacher
+    # hours grow to match, so some of these instances are infeasible.
+    teachers = {t_id: dict(t) for t_id, t in data['teachers'].items()}
+    assignments = list(data['assignments'])
+    next_id = max((a['id'] for a in assignments), default=0) + 1
+    for a in data['assignments']:
+        if a['hours'] > max_hours:
+            continue
+        for _ in range(copies - 1):
+            assignments.append(dict(a, id=next_id))
+            next_id += 1
+            teachers[a['teacher']]['week_hours'] += a['hours']
+    return dict(data, teachers=teachers, assignments=assignments)
+
+
+def campuses(count=2, seed=0, **kwargs):
+    # `count` independent schools in one solver input: no group, teacher or
+    # room is shared between them, so the timetable splits into at least
+    # `count` components. Ids are offset per school.
+    teachers = {}
+    assignments = []
+    for c in range(count):
+        data = make_inputs(seed=seed + c, **kwargs)
+        offset = 10000 * c
+        for t_id, t in data['teachers'].items():
+            teachers[t_id + offset] = t
+        for a in data['assignments']:
+            assignments.append(dict(
+                a,
+                id=a['id'] + offset,
+                group=a['group'] + offset,
+                teacher=a['teacher'] + offset,
+                room=a['room'] + offset,
+            ))
+    return dict(data, teachers=teachers, assignments=assignments)
+
+
+def school(scale='small', tightness='moderate', seed=0):
+    # Solver input of a SCALES size with TIGHTNESS teacher preferences
+    size = dict(SCALES[scale])
+    count = size.pop('campuses', 1)
+    groups = size['groups']
+    kwargs = {
+        'groups': groups,
+        'teachers': max(1, groups * 3 // 2),
+        'rooms': max(1, groups + groups // 4),
+        'pref_ratio': TIGHTNESS[tightness],
+    }
+    if count > 1:
+        return campuses(count, seed=seed, **kwargs)
+    return make_inputs(seed=seed, **kwargs)
@@ -0,0 +1,46 @@
+"""add generation_job
+
+Revision ID: 3f1c2a7d8e41
+Revises: 9b6e514fc9e5
+Create Date: 2026-10-17 09:12:05.114502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d8e41'
+down_revision = '9b6e514fc9e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('host', sa.String(length=255), nullable=True),
+    sa.Column('solutions', sa.Integer(), nullable=False),
+    sa.Column('objective', sa.Float(), nullable=True),
+    sa.Column('bound', sa.Float(), nullable=True),
+    sa.Column('wall_time', sa.Float(), nullable=True),
+    sa.Column('lessons', sa.Integer(), nullable=True),
+    sa.Column('message', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.create_index('ix_generation_job_status', ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_generation_job_status')
+
+    op.drop_table('generation_job')
@@ -0,0 +1,26 @@
+"""add user.timetable_version
+
+Revision ID: 5e2d9a7c1f48
+Revises: b8d41f6e2a95
+Create Date: 2026-10-17 23:41:37.205114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2d9a7c1f48'
+down_revision = 'b8d41f6e2a95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('timetable_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('timetable_version')
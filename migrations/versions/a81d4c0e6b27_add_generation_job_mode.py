@@ -0,0 +1,26 @@
+"""add generation_job.mode
+
+Revision ID: a81d4c0e6b27
+Revises: 3f1c2a7d8e41
+Create Date: 2026-10-17 10:41:36.208117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81d4c0e6b27'
+down_revision = '3f1c2a7d8e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('mode', sa.String(length=20), nullable=False, server_default='full'))
+
+
+def downgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.drop_column('mode')
@@ -0,0 +1,63 @@
+"""generation run metrics
+
+Revision ID: b8d41f6e2a95
+Revises: f2c7a9d4b318
+Create Date: 2026-10-17 21:04:12.518330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d41f6e2a95'
+down_revision = 'f2c7a9d4b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generation_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('mode', sa.String(length=20), nullable=False),
+    sa.Column('outcome', sa.String(length=20), nullable=False),
+    sa.Column('cached', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('lessons', sa.Integer(), nullable=True),
+    sa.Column('unplaced', sa.Integer(), nullable=True),
+    sa.Column('total_s', sa.Float(), nullable=True),
+    sa.Column('load_s', sa.Float(), nullable=True),
+    sa.Column('cache_s', sa.Float(), nullable=True),
+    sa.Column('availability_s', sa.Float(), nullable=True),
+    sa.Column('seed_s', sa.Float(), nullable=True),
+    sa.Column('build_s', sa.Float(), nullable=True),
+    sa.Column('solve_s', sa.Float(), nullable=True),
+    sa.Column('extract_s', sa.Float(), nullable=True),
+    sa.Column('save_s', sa.Float(), nullable=True),
+    sa.Column('variables', sa.Integer(), nullable=True),
+    sa.Column('constraints', sa.Integer(), nullable=True),
+    sa.Column('searches', sa.Integer(), nullable=True),
+    sa.Column('lns_steps', sa.Integer(), nullable=True),
+    sa.Column('conflicts', sa.BigInteger(), nullable=True),
+    sa.Column('branches', sa.BigInteger(), nullable=True),
+    sa.Column('solver_wall_s', sa.Float(), nullable=True),
+    sa.Column('solver_status', sa.String(length=20), nullable=True),
+    sa.Column('objective', sa.Float(), nullable=True),
+    sa.Column('bound', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['job_id'], ['generation_job.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generation_run', schema=None) as batch_op:
+        batch_op.create_index('ix_generation_run_job_id', ['job_id'], unique=False)
+        batch_op.create_index('ix_generation_run_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generation_run', schema=None) as batch_op:
+        batch_op.drop_index('ix_generation_run_user_id')
+        batch_op.drop_index('ix_generation_run_job_id')
+
+    op.drop_table('generation_run')
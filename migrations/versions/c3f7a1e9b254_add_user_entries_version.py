@@ -0,0 +1,26 @@
+"""add user.entries_version
+
+Revision ID: c3f7a1e9b254
+Revises: 5e2d9a7c1f48
+Create Date: 2026-10-18 10:12:48.331907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f7a1e9b254'
+down_revision = '5e2d9a7c1f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('entries_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('entries_version')
@@ -0,0 +1,26 @@
+"""add generation_job.preserved
+
+Revision ID: c52e9f1d7a30
+Revises: a81d4c0e6b27
+Create Date: 2026-10-17 14:05:12.448310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e9f1d7a30'
+down_revision = 'a81d4c0e6b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('preserved', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.drop_column('preserved')
@@ -0,0 +1,99 @@
+"""per-user indexes and name uniqueness
+
+Revision ID: d7b3e80c4f12
+Revises: c52e9f1d7a30
+Create Date: 2026-10-17 15:20:44.917204
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b3e80c4f12'
+down_revision = 'c52e9f1d7a30'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.env')
+
+def _rename_duplicates(table, length):
+    # Rows sharing a user and a name would break the new unique constraint:
+    # all but the oldest get " (2)", " (3)", ... appended, cut to fit the
+    # column, and are logged so nothing changes silently
+    conn = op.get_bind()
+    t = sa.table(table, sa.column('id'), sa.column('user_id'), sa.column('name'))
+    rows = conn.execute(sa.select(t.c.id, t.c.user_id, t.c.name).order_by(t.c.id)).all()
+    taken = {(row.user_id, row.name) for row in rows}
+    seen = set()
+    for row in rows:
+        if (row.user_id, row.name) not in seen:
+            seen.add((row.user_id, row.name))
+            continue
+        n = 2
+        while True:
+            suffix = f" ({n})"
+            name = row.name[:length - len(suffix)] + suffix
+            if (row.user_id, name) not in taken:
+                break
+            n += 1
+        taken.add((row.user_id, name))
+        conn.execute(t.update().where(t.c.id == row.id).values(name=name))
+        logger.warning("%s %s of user %s: duplicate name %r renamed to %r",
+                       table, row.id, row.user_id, row.name, name)
+
+
+def upgrade():
+    with op.batch_alter_table('teacher', schema=None) as batch_op:
+        batch_op.create_index('ix_teacher_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('class_group', schema=None) as batch_op:
+        batch_op.create_index('ix_class_group_user_id', ['user_id'], unique=False)
+
+    _rename_duplicates('subject', 100)
+    with op.batch_alter_table('subject', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_subject_user_name', ['user_id', 'name'])
+
+    _rename_duplicates('room', 50)
+    with op.batch_alter_table('room', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_room_user_name', ['user_id', 'name'])
+
+    with op.batch_alter_table('period', schema=None) as batch_op:
+        batch_op.create_index('ix_period_user_start', ['user_id', 'start_time'], unique=False)
+
+    with op.batch_alter_table('schedule_assignment', schema=None) as batch_op:
+        batch_op.create_index('ix_schedule_assignment_user_group', ['user_id', 'class_group_id'], unique=False)
+
+    with op.batch_alter_table('timetable_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_timetable_entry_user_slot', ['user_id', 'weekday', 'period_id'], unique=False)
+
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.create_index('ix_generation_job_user_status', ['user_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_generation_job_user_status')
+
+    with op.batch_alter_table('timetable_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_timetable_entry_user_slot')
+
+    with op.batch_alter_table('schedule_assignment', schema=None) as batch_op:
+        batch_op.drop_index('ix_schedule_assignment_user_group')
+
+    with op.batch_alter_table('period', schema=None) as batch_op:
+        batch_op.drop_index('ix_period_user_start')
+
+    with op.batch_alter_table('room', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_room_user_name', type_='unique')
+
+    with op.batch_alter_table('subject', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_subject_user_name', type_='unique')
+
+    with op.batch_alter_table('class_group', schema=None) as batch_op:
+        batch_op.drop_index('ix_class_group_user_id')
+
+    with op.batch_alter_table('teacher', schema=None) as batch_op:
+        batch_op.drop_index('ix_teacher_user_id')
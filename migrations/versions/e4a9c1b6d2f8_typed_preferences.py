@@ -0,0 +1,118 @@
+"""typed teacher / class group preferences
+
+Revision ID: e4a9c1b6d2f8
+Revises: d7b3e80c4f12
+Create Date: 2026-10-17 16:02:31.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c1b6d2f8'
+down_revision = 'd7b3e80c4f12'
+branch_labels = None
+depends_on = None
+
+teacher_preferred_period = sa.table(
+    'teacher_preferred_period', sa.column('teacher_id', sa.Integer), sa.column('period_id', sa.Integer)
+)
+class_group_allowed_period = sa.table(
+    'class_group_allowed_period', sa.column('class_group_id', sa.Integer), sa.column('period_id', sa.Integer)
+)
+
+
+def _ids(text, known):
+    # Comma-separated ids as stored before this revision; ids of periods
+    # that no longer exist are dropped
+    return [int(v) for v in (text or '').split(',') if v.strip() and int(v) in known]
+
+
+def upgrade():
+    op.create_table('teacher_preferred_period',
+    sa.Column('teacher_id', sa.Integer(), nullable=False),
+    sa.Column('period_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['period_id'], ['period.id'], ),
+    sa.ForeignKeyConstraint(['teacher_id'], ['teacher.id'], ),
+    sa.PrimaryKeyConstraint('teacher_id', 'period_id')
+    )
+    op.create_table('class_group_allowed_period',
+    sa.Column('class_group_id', sa.Integer(), nullable=False),
+    sa.Column('period_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['class_group_id'], ['class_group.id'], ),
+    sa.ForeignKeyConstraint(['period_id'], ['period.id'], ),
+    sa.PrimaryKeyConstraint('class_group_id', 'period_id')
+    )
+    with op.batch_alter_table('teacher', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('preferred_day_mask', sa.Integer(), nullable=True))
+
+    conn = op.get_bind()
+    known = {row.id for row in conn.execute(sa.text('SELECT id FROM period'))}
+
+    rows = []
+    for t in conn.execute(sa.text('SELECT id, preferred_days, preferred_periods FROM teacher')):
+        mask = 0
+        for d in (t.preferred_days or '').split(','):
+            if d.strip() and 1 <= int(d) <= 5:
+                mask |= 1 << (int(d) - 1)
+        if mask:
+            conn.execute(
+                sa.text('UPDATE teacher SET preferred_day_mask = :mask WHERE id = :id'),
+                {'mask': mask, 'id': t.id},
+            )
+        rows.extend({'teacher_id': t.id, 'period_id': p} for p in set(_ids(t.preferred_periods, known)))
+    if rows:
+        op.bulk_insert(teacher_preferred_period, rows)
+
+    rows = []
+    for g in conn.execute(sa.text('SELECT id, allowed_periods FROM class_group')):
+        rows.extend({'class_group_id': g.id, 'period_id': p} for p in set(_ids(g.allowed_periods, known)))
+    if rows:
+        op.bulk_insert(class_group_allowed_period, rows)
+
+    with op.batch_alter_table('teacher', schema=None) as batch_op:
+        batch_op.drop_column('preferred_days')
+        batch_op.drop_column('preferred_periods')
+
+    with op.batch_alter_table('class_group', schema=None) as batch_op:
+        batch_op.drop_column('allowed_periods')
+
+
+def downgrade():
+    with op.batch_alter_table('class_group', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('allowed_periods', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('teacher', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('preferred_periods', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('preferred_days', sa.Text(), nullable=True))
+
+    conn = op.get_bind()
+    periods = {}
+    for row in conn.execute(sa.text('SELECT teacher_id, period_id FROM teacher_preferred_period')):
+        periods.setdefault(row.teacher_id, []).append(row.period_id)
+    for t in conn.execute(sa.text('SELECT id, preferred_day_mask FROM teacher')).all():
+        days = [d for d in range(1, 6) if t.preferred_day_mask and t.preferred_day_mask >> (d - 1) & 1]
+        conn.execute(
+            sa.text('UPDATE teacher SET preferred_days = :days, preferred_periods = :periods WHERE id = :id'),
+            {
+                'days': ','.join(map(str, days)) or None,
+                'periods': ','.join(map(str, sorted(periods.get(t.id, [])))) or None,
+                'id': t.id,
+            },
+        )
+
+    allowed = {}
+    for row in conn.execute(sa.text('SELECT class_group_id, period_id FROM class_group_allowed_period')):
+        allowed.setdefault(row.class_group_id, []).append(row.period_id)
+    for group_id, period_ids in allowed.items():
+        conn.execute(
+            sa.text('UPDATE class_group SET allowed_periods = :periods WHERE id = :id'),
+            {'periods': ','.join(map(str, sorted(period_ids))), 'id': group_id},
+        )
+
+    with op.batch_alter_table('teacher', schema=None) as batch_op:
+        batch_op.drop_column('preferred_day_mask')
+
+    op.drop_table('class_group_allowed_period')
+    op.drop_table('teacher_preferred_period')
@@ -0,0 +1,47 @@
+"""solver settings, junior class groups, accepting the current best
+
+Revision ID: f2c7a9d4b318
+Revises: e4a9c1b6d2f8
+Create Date: 2026-10-17 18:21:47.102934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7a9d4b318'
+down_revision = 'e4a9c1b6d2f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('solver_settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('teacher_gaps', sa.Integer(), nullable=False),
+    sa.Column('unpreferred_periods', sa.Integer(), nullable=False),
+    sa.Column('subject_spread', sa.Integer(), nullable=False),
+    sa.Column('junior_late', sa.Integer(), nullable=False),
+    sa.Column('junior_periods', sa.Integer(), nullable=False),
+    sa.Column('soft_preferences', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+    with op.batch_alter_table('class_group', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_junior', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('accept_requested', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('generation_job', schema=None) as batch_op:
+        batch_op.drop_column('accept_requested')
+
+    with op.batch_alter_table('class_group', schema=None) as batch_op:
+        batch_op.drop_column('is_junior')
+
+    op.drop_table('solver_settings')
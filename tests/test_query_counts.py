@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import app, db  # noqa: E402
+from benchmarks.seed import seed_school  # noqa: E402
+from benchmarks.synthetic import scaled_inputs  # noqa: E402
+
+# SQL statements each view may issue, loading the user included. Eager
+# loading keeps them fixed however large the school is; a lazy load in a
+# template loop adds one per row and fails here.
+MAX_QUERIES = {
+    '/dashboard': 4,
+    '/teachers': 3,
+    '/subjects': 2,
+    '/rooms': 2,
+    '/class-groups': 3,
+}
+SCHOOL_SIZES = (40, 300)  # assignments
+
+
+@pytest.fixture(scope='module')
+def school():
+    # {assignments: user id}, plus every statement the engine runs
+    app.config['DASHBOARD_CACHE_SIZE'] = 0  # measure real renders
+    with app.app_context():
+        db.create_all()
+        users = {
+            size: seed_school(f'user{size}', scaled_inputs(size, seed=size, periods=8)).id
+            for size in SCHOOL_SIZES
+        }
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, sql, *rest: statements.append(sql))
+    return users, statements
+
+
+def count_queries(school, size, view):
+    users, statements = school
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(users[size])
+        session['_fresh'] = True
+    statements.clear()
+    response = client.get(view)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('view', MAX_QUERIES)
+@pytest.mark.parametrize('size', SCHOOL_SIZES)
+def test_list_view_query_budget(school, size, view):
+    assert count_queries(school, size, view) <= MAX_QUERIES[view]
+
+
+@pytest.mark.parametrize('view', MAX_QUERIES)
+def test_query_count_independent_of_school_size(school, view):
+    counts = {size: count_queries(school, size, view) for size in SCHOOL_SIZES}
+    assert len(set(counts.values())) == 1, counts